@@ -1,20 +1,35 @@
-import requests
+import os
 import sys
-import pathlib
 import json
+import pathlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from src.nonogram import load_directory
+from src.solution import read_solution
+from src.verify import verify_solution
 
-if len(sys.argv) != 3:
-    print('Usage: checkall.py <clue_dir> <solution_dir>')
-    sys.exit(1)
+VERIFY_URL = 'http://jfschaefer.de:8973/verify/ws2425a31a/nonograms'
 
-clues_dir = pathlib.Path(sys.argv[1])
-solutions_dir = pathlib.Path(sys.argv[2])
+def check_local(task):
+    """Verify one solution file against its parsed nonogram"""
+    solution_path, nonogram = task
+    if nonogram is None:
+        return 'Wrong: no clues for this solution'
+    return verify_solution(nonogram, read_solution(solution_path))[1]
 
-correct = 0
-wrong = 0
+def make_session(pool_size):
+    """HTTP session keeping up to pool_size connections to the server open"""
+    import requests
+    from requests.adapters import HTTPAdapter
 
-for solution_path in solutions_dir.glob('*.solution'):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
+def check_remote(session, url, clues_dir, solution_path):
+    """Verify one solution file with the course server or src.server"""
     clues = (clues_dir / solution_path.name.replace('solution', 'clues')).read_text()
     clue_lines = clues.splitlines()
     solution = solution_path.read_text()
@@ -29,13 +44,57 @@ for solution_path in solutions_dir.glob('*.solution'):
         'solution': 'anonymous problem\n' + clue_lines[0].split()[0] + '\n' + clue_lines[1] + '\n' + solution,
     }
 
-    response = requests.get(f'http://jfschaefer.de:8973/verify/ws2425a31a/nonograms', data=json.dumps(data))
-    print(solution_path.name)
-    print('   ', response.text)
-    if response.text == 'Correct':
-        correct += 1
+    response = session.get(url, data=json.dumps(data))
+    if response.headers.get('Content-Type') == 'application/json':
+        # src.server answers with JSON
+        reply = response.json()
+        return reply['results'][0]['verdict'] if 'results' in reply else f"Error: {reply['error']}"
+    return response.text
+
+def main():
+    parser = argparse.ArgumentParser(description='Check solution files against their clues')
+    parser.add_argument('clue_dir', help='Directory containing .clues files')
+    parser.add_argument('solution_dir', help='Directory containing .solution files')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count(),
+                        help='Number of solutions checked in parallel')
+    parser.add_argument('--remote', action='store_true',
+                        help='Check with the course server instead of locally')
+    parser.add_argument('--url', default=VERIFY_URL,
+                        help='Verification service used by --remote, e.g. http://127.0.0.1:8973/ for src.server')
+    args = parser.parse_args()
+
+    clues_dir = pathlib.Path(args.clue_dir)
+    solution_paths = sorted(pathlib.Path(args.solution_dir).glob('*.solution'))
+
+    if args.remote:
+        session = make_session(args.jobs)
+        with ThreadPoolExecutor(args.jobs) as pool:
+            verdicts = pool.map(lambda path: check_remote(session, args.url, clues_dir, path), solution_paths)
+            verdicts = list(verdicts)
     else:
-        wrong += 1
+        errors = []
+        puzzles = {nonogram.name: nonogram for nonogram in load_directory(clues_dir, errors=errors)}
+        for path, message in errors:
+            print(f"Skipping {path}: {message}")
+        tasks = [(path, puzzles.get(path.stem)) for path in solution_paths]
+        with ProcessPoolExecutor(args.jobs) as pool:
+            verdicts = list(pool.map(check_local, tasks, chunksize=8))
+
+    correct = 0
+    wrong = 0
+
+    for solution_path, verdict in zip(solution_paths, verdicts):
+        print(solution_path.name)
+        print('   ', verdict)
+        if verdict == 'Correct':
+            correct += 1
+        else:
+            wrong += 1
+
+    print()
+    print(f'Correct: {correct}, Wrong: {wrong}')
+    if wrong:
+        sys.exit(1)
 
-print()
-print(f'Correct: {correct}, Wrong: {wrong}')
+if __name__ == '__main__':
+    main()
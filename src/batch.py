@@ -0,0 +1,100 @@
+import os
+import time
+import queue
+import signal
+import multiprocessing as mp
+from collections import deque
+
+def _worker(solve, name, puzzle, kwargs, results):
+    """Solve one puzzle in a worker process and report back"""
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so a timeout also stops the processes the
+        # worker starts, e.g. the engines of a portfolio race
+        os.setpgrp()
+    start_time = time.time()
+    try:
+        solved, _ = solve(puzzle, **kwargs)
+        status = 'solved' if solved else 'unsolved'
+        results.put((name, status, time.time() - start_time, None))
+    except Exception as e:
+        results.put((name, 'error', time.time() - start_time, str(e)))
+
+def _terminate(process):
+    """Stop a worker together with the processes it started"""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            return
+        except ProcessLookupError:
+            pass  # The worker has not made its group yet
+    process.terminate()
+
+def run_batch(tasks, solve, jobs=1, timeout=None, **kwargs):
+    """Solve puzzles in parallel worker processes.
+
+    tasks is a list of (name, puzzle) pairs, where puzzle is a clue file or
+    a parsed Nonogram. solve is called as solve(puzzle, **kwargs) and must
+    return (solved, solution). Each puzzle runs in its own process, so a
+    puzzle exceeding timeout seconds is terminated without stalling the
+    others. Results are reported as they complete; returns a list of
+    (name, status, seconds, error) in completion order."""
+    ctx = mp.get_context()
+    results = ctx.Queue()
+    pending = deque(tasks)
+    running = {}  # name -> (process, start_time)
+    finished = []
+
+    def report(result):
+        name, status, elapsed, error = result
+        finished.append(result)
+        line = f"[{len(finished)}/{len(tasks)}] {name}: {status} ({elapsed:.3f}s)"
+        if error:
+            line += f" - {error}"
+        print(line, flush=True)
+
+    while pending or running:
+        # Keep all workers busy
+        while pending and len(running) < jobs:
+            name, puzzle = pending.popleft()
+            process = ctx.Process(target=_worker, args=(solve, name, puzzle, kwargs, results))
+            process.start()
+            running[name] = (process, time.time())
+
+        try:
+            result = results.get(timeout=0.1)
+            process, _ = running.pop(result[0])
+            process.join()
+            report(result)
+            continue
+        except queue.Empty:
+            pass
+
+        now = time.time()
+        for name, (process, start_time) in list(running.items()):
+            if timeout is not None and now - start_time > timeout:
+                _terminate(process)
+                process.join()
+                del running[name]
+                report((name, 'timeout', now - start_time, None))
+            elif not process.is_alive() and process.exitcode != 0:
+                # Died without reporting a result
+                del running[name]
+                report((name, 'error', now - start_time, f"exit code {process.exitcode}"))
+
+    return finished
+
+def print_summary(results, wall_time):
+    """Print a table of the batch results"""
+    name_width = max([len('Puzzle')] + [len(r[0]) for r in results])
+    print()
+    print(f"{'Puzzle':<{name_width}}  {'Status':<9}  {'Time':>8}")
+    for name, status, elapsed, _ in sorted(results):
+        print(f"{name:<{name_width}}  {status:<9}  {elapsed:>7.3f}s")
+
+    counts = {}
+    for _, status, _, _ in results:
+        counts[status] = counts.get(status, 0) + 1
+    print()
+    print(f"Solved: {counts.get('solved', 0)}, Unsolved: {counts.get('unsolved', 0)}, "
+          f"Timeout: {counts.get('timeout', 0)}, Error: {counts.get('error', 0)}")
+    print(f"Total time: {wall_time:.3f} seconds")
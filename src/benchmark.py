@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import subprocess
+import statistics
+import tracemalloc
+from src.nonogram import load_directory
+from src.sat_encoder import ENCODINGS
+from src.instrument import Recorder, PHASES
+from src.generator import random_puzzle
+from src.main import solve_puzzle
+from src.portfolio import engine_name
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Regressions smaller than this many seconds are treated as noise, as are
+# those within NOISE_STDEVS standard deviations of the runs of both sides
+MIN_SLOWDOWN = 0.02
+NOISE_STDEVS = 3
+
+# Allowed time to import src.main in a fresh interpreter, see check_startup
+STARTUP_BUDGET = 0.25
+
+# Modules that importing src.main must leave to the code paths using them
+LAZY_MODULES = ('matplotlib', 'pysat.formula', 'pysat.solvers', 'multiprocessing', 'sqlite3')
+
+# Measures the import in the child process, then lists the loaded modules
+STARTUP_PROBE = ("import sys, time; start = time.perf_counter(); import src.main; "
+                 "print(time.perf_counter() - start); print(' '.join(sys.modules))")
+
+def synthetic_puzzles(sizes=((10, 10), (20, 20), (30, 30)), ncolors=(1, 2), density=0.55, seed=0):
+    """Random puzzles with a fixed seed, so every run benchmarks the same ones"""
+    rng = random.Random(seed)
+    for size in sizes:
+        for k in ncolors:
+            yield random_puzzle(size, k, density, rng)[0]
+
+def run_once(nonogram, encoding, propagate, solver_name):
+    """Solve a puzzle once, returns (solved, recorder)"""
+    recorder = Recorder()
+    if nonogram.parse_time is not None:
+        recorder.add_time('parse', nonogram.parse_time)
+    solution, _ = solve_puzzle(nonogram, encoding=encoding, propagate=propagate,
+                               solver_name=solver_name, recorder=recorder)
+    return solution is not None, recorder
+
+def peak_memory(nonogram, encoding, propagate, solver_name):
+    """Peak Python heap use of one solve in bytes.
+
+    Measured in a separate run, as tracemalloc slows down the timed runs.
+    Memory of the native SAT engine is not included."""
+    tracemalloc.start()
+    try:
+        run_once(nonogram, encoding, propagate, solver_name)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark_puzzle(nonogram, encoding='pairwise', propagate=True, solver_name='glucose3', repeat=5):
+    """Solve a puzzle repeat times and summarize its phase times and counters"""
+    totals = []
+    phases = {}
+    for _ in range(repeat):
+        solved, recorder = run_once(nonogram, encoding, propagate, solver_name)
+        totals.append(sum(recorder.phases.values()))
+        for name, seconds in recorder.phases.items():
+            phases.setdefault(name, []).append(seconds)
+
+    return {
+        'solved': solved,
+        'total': statistics.median(totals),
+        'total_min': min(totals),
+        'total_stdev': statistics.stdev(totals) if len(totals) > 1 else 0.0,
+        'phases': {name: statistics.median(phases[name]) for name in PHASES if name in phases},
+        'counters': recorder.counters,
+        'peak_memory': peak_memory(nonogram, encoding, propagate, solver_name),
+    }
+
+def stress(sizes, ncolors=2, density=0.55, encoding='pairwise', propagate=True,
+           solver_name='glucose3', seed=0, memory=True, limit=None):
+    """Solve one random puzzle per size, returns one result dict per size.
+
+    Each result holds the phase times and formula size of a single run, and
+    with memory the peak Python heap use of a second run (see peak_memory).
+    Once a size takes longer than limit seconds the larger ones are skipped,
+    so list the sizes in increasing order."""
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        nonogram, _ = random_puzzle(size, ncolors, density, rng)
+        solved, recorder = run_once(nonogram, encoding, propagate, solver_name)
+        results.append({
+            'name': nonogram.name,
+            'cells': nonogram.shape.num_cells,
+            'solved': solved,
+            'phases': dict(recorder.phases),
+            'total': sum(recorder.phases.values()),
+            'counters': recorder.counters,
+            'peak_memory': peak_memory(nonogram, encoding, propagate, solver_name) if memory else None,
+        })
+        if limit is not None and results[-1]['total'] > limit:
+            break
+    return results
+
+def print_stress(results):
+    """Print how time and memory grow over the sizes of a stress run.
+
+    Growth is the exponent e of total time ~ cells^e between one size and
+    the previous one, so 1 means linear and 2 quadratic scaling."""
+    name_width = max([len('Puzzle')] + [len(result['name']) for result in results])
+    print(f"{'Puzzle':<{name_width}}  {'Cells':>7}  {'Vars':>9}  {'Clauses':>10}  {'Propagate':>9}"
+          f"  {'Encode':>8}  {'Solve':>8}  {'Total':>8}  {'Growth':>6}  {'Memory':>10}")
+    previous = None
+    for result in results:
+        phases, counters = result['phases'], result['counters']
+        solve = phases.get('load', 0.0) + phases.get('solve', 0.0)
+        growth = ''
+        if previous and previous['total'] > 0 and result['cells'] > previous['cells']:
+            growth = f"{math.log(result['total'] / previous['total']) / math.log(result['cells'] / previous['cells']):.2f}"
+        memory = '' if result['peak_memory'] is None else f"{result['peak_memory'] / 2 ** 20:.1f}MB"
+        line = (f"{result['name']:<{name_width}}  {result['cells']:>7}  {counters.get('variables', 0):>9}"
+                f"  {counters.get('clauses', 0):>10}  {phases.get('propagate', 0.0):>8.3f}s"
+                f"  {phases.get('encode', 0.0):>7.3f}s  {solve:>7.3f}s  {result['total']:>7.3f}s"
+                f"  {growth:>6}  {memory:>10}")
+        if not result['solved']:
+            line += "  (unsolved)"
+        print(line)
+        previous = result
+
+def startup_time(repeat=5):
+    """Best time over repeat fresh interpreters to import src.main.
+
+    Returns (seconds, modules), modules being the LAZY_MODULES the import
+    loaded."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=root, check=True,
+                                capture_output=True, text=True).stdout.splitlines()
+        times.append(float(output[0]))
+        loaded = set(output[1].split())
+    return min(times), [name for name in LAZY_MODULES if name in loaded]
+
+def check_startup(budget=STARTUP_BUDGET, repeat=5):
+    """Print the startup time of the CLI, returns False if it is over budget"""
+    seconds, loaded = startup_time(repeat)
+    print(f"Importing src.main: {seconds:.4f}s (budget {budget:.4f}s)")
+    for name in loaded:
+        print(f"Startup regression: importing src.main loads {name}")
+    if seconds > budget:
+        print(f"Startup regression: {seconds:.4f}s is over the budget of {budget:.4f}s")
+    return seconds <= budget and not loaded
+
+def compare(results, baseline, threshold):
+    """List the puzzles that got slower than the baseline by more than threshold.
+
+    The best of the repeated runs is compared, as it is the least noisy,
+    and slowdowns within the noise of the runs do not count (see
+    MIN_SLOWDOWN and NOISE_STDEVS). Returns (name, baseline seconds, seconds) tuples; puzzles missing from
+    the baseline are not compared."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        noise = NOISE_STDEVS * (old.get('total_stdev', 0.0) + result['total_stdev'])
+        if result['total_min'] - old['total_min'] > max(old['total_min'] * threshold, MIN_SLOWDOWN, noise):
+            regressions.append((name, old['total_min'], result['total_min']))
+    return regressions
+
+def print_results(results, baseline=None):
+    """Print a table of the benchmark results"""
+    name_width = max([len('Puzzle')] + [len(name) for name in results])
+    header = f"{'Puzzle':<{name_width}}  {'Vars':>8}  {'Clauses':>9}  {'Median':>9}  {'Best':>9}  {'Stdev':>8}  {'Memory':>10}"
+    if baseline:
+        header += f"  {'Change':>8}"
+    print(header)
+    for name, result in results.items():
+        counters = result['counters']
+        line = (f"{name:<{name_width}}  {counters.get('variables', 0):>8}  {counters.get('clauses', 0):>9}"
+                f"  {result['total']:>8.4f}s  {result['total_min']:>8.4f}s  {result['total_stdev']:>7.4f}s"
+                f"  {result['peak_memory'] / 1024:>8.0f}KB")
+        if baseline and name in baseline and baseline[name]['total_min'] > 0:
+            change = result['total_min'] / baseline[name]['total_min'] - 1
+            line += f"  {change:>+7.1%}"
+        if not result['solved']:
+            line += "  (unsolved)"
+        print(line)
+
+def main():
+    """Benchmark the solver on the clue corpus and compare with a baseline"""
+    parser = argparse.ArgumentParser(description='Benchmark the nonogram solver')
+    parser.add_argument('--input-dir', default='clues', help='Directory containing .clues files')
+    parser.add_argument('--synthetic', action='store_true', help='Also benchmark random generated puzzles')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='pairwise',
+                        help='Constraint encoding used for the SAT formula')
+    parser.add_argument('--no-propagate', action='store_true',
+                        help='Skip the line solving pass before SAT encoding')
+    parser.add_argument('--solver', type=engine_name, default='glucose3', help='pysat engine used to solve the formula')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per puzzle')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare with')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown per puzzle relative to the baseline (0.2 = 20%%)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Only check the CLI startup time against its budget')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET,
+                        help='Allowed seconds to import src.main for --startup')
+
+    args = parser.parse_args()
+
+    if args.startup:
+        if not check_startup(args.startup_budget, args.repeat):
+            sys.exit(1)
+        return
+
+    puzzles = list(load_directory(args.input_dir))
+    if args.synthetic:
+        puzzles.extend(synthetic_puzzles())
+
+    config = {
+        'encoding': args.encoding,
+        'propagate': not args.no_propagate,
+        'solver': args.solver,
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored['config'] == config:
+            baseline = stored['puzzles']
+        else:
+            print(f"Baseline {args.baseline} was recorded with {stored['config']}, not comparing")
+
+    results = {}
+    for nonogram in puzzles:
+        results[nonogram.name] = benchmark_puzzle(nonogram, args.encoding, not args.no_propagate,
+                                                  args.solver, args.repeat)
+
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'python': platform.python_version(), 'puzzles': results},
+                      f, indent=1, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        print()
+        for name, old, new in regressions:
+            print(f"Regression: {name} took {new:.4f}s, baseline {old:.4f}s")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+if __name__ == '__main__':
+    main()
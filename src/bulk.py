@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+import numpy as np
+from src.grid import grid_shape
+from src.solution import save_solution, solution_cells
+
+try:
+    import fcntl
+except ImportError:  # Windows, appends are not locked there
+    fcntl = None
+
+# Start of every bulk file, followed by the records
+MAGIC = b'NONOGRD1'
+
+# Each record is its header length, a JSON header and the packed cells
+RECORD_HEADER = struct.Struct('<I')
+
+# The index next to a bulk file has one JSON line per record: its header
+# plus the offset of its cells
+INDEX_SUFFIX = '.index'
+
+def pack_solution(solution):
+    """Color index of every cell of a solution grid as uint8, '-' = 0, 'a' = 1"""
+    return solution_cells(solution).astype(np.uint8)
+
+def unpack_solution(cells, shape):
+    """Solution rows of packed cells, the inverse of pack_solution"""
+    chars = np.where(cells == 0, ord('-'), cells + (ord('a') - 1)).astype(np.uint8)
+    return shape.split_rows(chars.tobytes().decode())
+
+def index_path(path):
+    """Path of the index file of a bulk file"""
+    return path + INDEX_SUFFIX
+
+def _parse_index(data):
+    """(offset of the cells, header) of each complete line of index data"""
+    for line in data.split(b'\n'):
+        try:
+            header = json.loads(line)
+        except ValueError:
+            continue  # empty, or cut short by a crash while appending
+        yield header.pop('offset'), header
+
+def _walk_records(buffer, offset, size):
+    """(offset of the cells, header) of the records from offset on.
+
+    Stops at a record cut short by a crash while appending."""
+    while offset + RECORD_HEADER.size <= size:
+        header_length, = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        try:
+            header = json.loads(buffer[start:start + header_length])
+        except ValueError:
+            return
+        cells_offset = start + header_length
+        if cells_offset + header['cells'] > size:
+            return
+        yield cells_offset, header
+        offset = cells_offset + header['cells']
+
+class BulkWriter:
+    """Appends solutions to a bulk file, one record each.
+
+    Several processes may append to the same file, e.g. the workers of a
+    batch run; each record and its index line are written under an
+    exclusive lock. A puzzle appended again replaces the earlier record
+    for readers, unless its latest record already holds the same
+    solution, then nothing is written. The writer keeps the index in
+    memory and only reads the lines other processes added since."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # name -> (offset of the cells, header)
+        self.index_read = 0  # bytes of the index file read so far
+        self.covered = len(MAGIC)  # end of the records the index covers
+
+    def append(self, nonogram, solution):
+        """Append the solution of a puzzle, returns whether a record was written"""
+        cells = pack_solution(solution).tobytes()
+        header = {
+            'name': nonogram.name,
+            'grid_type': nonogram.grid_type,
+            'size': list(nonogram.size),
+            'colors': nonogram.colors,
+            'cells': len(cells),
+        }
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+
+        with open(self.path, 'a+b') as f, open(index_path(self.path), 'a+b') as index:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Another process may have appended since the file was opened
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    f.write(MAGIC)
+                    size = len(MAGIC)
+                self._update_index(f, index, size)
+
+                latest = self.index.get(nonogram.name)
+                if latest is not None and latest[1] == header:
+                    f.seek(latest[0])
+                    if f.read(len(cells)) == cells:
+                        return False
+
+                f.write(RECORD_HEADER.pack(len(encoded)) + encoded + cells)
+                self._add(index, size + RECORD_HEADER.size + len(encoded), header)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return True
+
+    def _update_index(self, f, index, size):
+        """Read the index lines added since the last call, under the lock.
+
+        Records the index misses (files from before the index, a crash
+        between the two writes) are indexed from their headers."""
+        index.seek(self.index_read)
+        data = index.read()
+        self.index_read += len(data)
+        if data and not data.endswith(b'\n'):
+            # A line cut short by a crash, end it so the next one is whole
+            index.write(b'\n')
+            self.index_read += 1
+        for offset, header in _parse_index(data):
+            self.index[header['name']] = (offset, header)
+            self.covered = max(self.covered, offset + header['cells'])
+
+        if self.covered < size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for offset, header in list(_walk_records(buffer, self.covered, size)):
+                    self._add(index, offset, header)
+            # Skip what is left, the tail of a record cut short
+            self.covered = size
+
+    def _add(self, index, offset, header):
+        line = json.dumps(dict(header, offset=offset), separators=(',', ':')).encode() + b'\n'
+        index.write(line)
+        self.index_read += len(line)
+        self.index[header['name']] = (offset, header)
+        self.covered = offset + header['cells']
+
+# Writers by path, so a process reads an index only once over many appends
+_writers = {}
+
+def bulk_writer(path):
+    """The BulkWriter of this process for a bulk file"""
+    if path not in _writers:
+        _writers[path] = BulkWriter(path)
+    return _writers[path]
+
+class BulkReader:
+    """Memory-mapped access to the solutions of a bulk file.
+
+    Opening reads the index file, and only walks the record headers it
+    does not cover; the cells are not read until asked for, and grid()
+    returns views into the mapping rather than copies."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a bulk solution file")
+
+        self.index = {}  # name -> (offset of the cells, header)
+        covered = len(MAGIC)
+        try:
+            with open(index_path(path), 'rb') as f:
+                for offset, header in _parse_index(f.read()):
+                    if offset + header['cells'] > size:
+                        break
+                    self.index[header['name']] = (offset, header)
+                    covered = max(covered, offset + header['cells'])
+        except FileNotFoundError:
+            pass
+        for offset, header in _walk_records(self.map, covered, size):
+            self.index[header['name']] = (offset, header)
+
+    def names(self):
+        return list(self.index)
+
+    def header(self, name):
+        """Grid type, size and colors of a puzzle's solution"""
+        return self.index[name][1]
+
+    def grid(self, name):
+        """Cells of a solution as a uint8 view into the file.
+
+        'rect' solutions have the (height, width) shape, others are flat
+        in cell number order (see GridShape)."""
+        offset, header = self.index[name]
+        cells = np.frombuffer(self.map, dtype=np.uint8, count=header['cells'], offset=offset)
+        if header['grid_type'] == 'rect':
+            return cells.reshape(header['size'])
+        return cells
+
+    def solution(self, name):
+        """A solution as rows of characters, like read_solution"""
+        header = self.header(name)
+        shape = grid_shape(header['grid_type'], tuple(header['size']))
+        return unpack_solution(self.grid(name).ravel(), shape)
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def export_solutions(bulk_path, output_dir, names=None):
+    """Write the solutions of a bulk file as .solution files, returns their count"""
+    os.makedirs(output_dir, exist_ok=True)
+    with BulkReader(bulk_path) as reader:
+        names = reader.names() if names is None else names
+        for name in names:
+            save_solution(reader.solution(name), os.path.join(output_dir, f"{name}.solution"))
+    return len(names)
+
+def main():
+    """List or export the solutions of a bulk file"""
+    parser = argparse.ArgumentParser(description='Work with bulk solution files written by --bulk-output')
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help='List the puzzles of a bulk file')
+    listing.add_argument('bulk_file')
+    export = commands.add_parser('export', help='Write the solutions as .solution files, e.g. for checkall.py')
+    export.add_argument('bulk_file')
+    export.add_argument('output_dir')
+    export.add_argument('names', nargs='*', help='Puzzles to export (default: all)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'list':
+            with BulkReader(args.bulk_file) as reader:
+                for name in reader.names():
+                    header = reader.header(name)
+                    print(f"{name}  {header['grid_type']} {'x'.join(map(str, header['size']))}  "
+                          f"{len(header['colors']) - 1} colors")
+        else:
+            count = export_solutions(args.bulk_file, args.output_dir, args.names or None)
+            print(f"Exported {count} solutions to {args.output_dir}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
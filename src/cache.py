@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# Bump when the stored format changes
+CACHE_FORMAT = 1
+
+# Modules whose code decides what gets stored: the solutions, and in main.py
+# (solve_puzzle) and session.py the status, solution counts and conflicts of
+# the stats; editing them invalidates the cache
+CACHE_SOURCES = ('nonogram.py', 'grid.py', 'line_solver.py', 'sat_encoder.py', 'var_layout.py', 'solver.py',
+                 'main.py', 'session.py')
+
+DEFAULT_MAX_ENTRIES = 10000
+
+_code_version = None
+
+def code_version():
+    """Hash of the solver sources, computed once per process"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in CACHE_SOURCES:
+            with open(os.path.join(src_dir, name), 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+def cache_key(nonogram):
+    """Content hash of a parsed nonogram plus the solver code version"""
+    normalized = {
+        'grid': nonogram.grid_type,
+        'size': list(nonogram.size),
+        'colors': [color.lower() for color in nonogram.colors],
+        'clues': {direction: [clue.tolist() for clue in clues]
+                  for direction, clues in nonogram.clues.items()},
+        'code': code_version(),
+    }
+    text = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class SolutionCache:
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'solutions.sqlite'), timeout=30)
+        # Allow batch workers to read while one of them writes
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS solutions ('
+            ' key TEXT PRIMARY KEY, solved INTEGER, solution TEXT, stats TEXT,'
+            ' created REAL, accessed REAL)'
+        )
+        self.db.commit()
+
+    def get(self, nonogram):
+        """Look up a puzzle, returns (solved, solution, stats) or None"""
+        key = cache_key(nonogram)
+        row = self.db.execute(
+            'SELECT solved, solution, stats FROM solutions WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        self.db.execute('UPDATE solutions SET accessed = ? WHERE key = ?', (time.time(), key))
+        self.db.commit()
+
+        solved, text, stats = row
+        solution = [list(line) for line in text.split('\n')] if solved else None
+        return bool(solved), solution, json.loads(stats)
+
+    def put(self, nonogram, solved, solution, stats=None):
+        """Store the result for a puzzle and evict the least recently used entries"""
+        now = time.time()
+        text = '\n'.join(''.join(row) for row in solution) if solved else ''
+        self.db.execute(
+            'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?)',
+            (cache_key(nonogram), int(solved), text, json.dumps(stats or {}), now, now),
+        )
+        self.db.execute(
+            'DELETE FROM solutions WHERE key IN ('
+            ' SELECT key FROM solutions ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,81 @@
+import os
+import random
+import argparse
+import colorsys
+from src.nonogram import Nonogram, GRID_TYPES
+from src.grid import grid_shape
+from src.solution import save_solution
+
+# Palette of generated puzzles, background first; more colors get spread out hues
+COLORS = ('#ffffff', '#000000', '#ff0000', '#0000ff', '#00aa00')
+
+def puzzle_colors(ncolors):
+    """Background color followed by ncolors distinct cell colors"""
+    if ncolors < 1 or ncolors > 26:
+        raise ValueError(f"between 1 and 26 colors are supported, got {ncolors}")
+    colors = list(COLORS[:ncolors + 1])
+    extra = ncolors + 1 - len(colors)
+    for i in range(extra):
+        r, g, b = colorsys.hsv_to_rgb((i + 0.5) / extra, 0.8, 0.8)
+        colors.append(f"#{round(r * 255):02x}{round(g * 255):02x}{round(b * 255):02x}")
+    return colors
+
+def random_grid(row_lengths, ncolors, density, rng):
+    """Rows of random solution characters, density is the share of colored cells"""
+    letters = [chr(ord('a') + i) for i in range(ncolors)]
+    return [[rng.choice(letters) if rng.random() < density else '-' for _ in range(length)]
+            for length in row_lengths]
+
+def random_puzzle(size, ncolors=1, density=0.55, rng=None, name=None, grid_type='rect'):
+    """Random puzzle made from a random grid, so it has at least that solution.
+
+    size is (height, width) for 'rect' and (n,) for 'tri' grids. Returns
+    (nonogram, grid); the puzzle may have other solutions besides grid."""
+    rng = rng or random.Random()
+    grid = random_grid(grid_shape(grid_type, tuple(size)).row_lengths, ncolors, density, rng)
+    if name is None:
+        name = f"random-{'x'.join(map(str, size))}-{ncolors}c"
+    return Nonogram.from_grid(grid, puzzle_colors(ncolors), name, grid_type), grid
+
+def parse_size(text):
+    """Grid size from the command line, e.g. '100x80' or '50' for a square"""
+    try:
+        size = tuple(int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size '{text}'") from None
+    if len(size) == 1:
+        size = size * 2
+    if len(size) != 2 or min(size) < 1:
+        raise argparse.ArgumentTypeError(f"invalid size '{text}'")
+    return size
+
+def main():
+    """Write random puzzles as .clues files"""
+    parser = argparse.ArgumentParser(description='Generate random nonogram puzzles')
+    parser.add_argument('--output-dir', default='generated', help='Directory to write the .clues files to')
+    parser.add_argument('--size', type=parse_size, default=(20, 20),
+                        help="Grid size as HEIGHTxWIDTH, e.g. 100x100 (for 'tri' only HEIGHT is used)")
+    parser.add_argument('--grid-type', choices=GRID_TYPES, default='rect', help='Type of the grid')
+    parser.add_argument('--colors', type=int, default=1, help='Number of colors besides the background')
+    parser.add_argument('--density', type=float, default=0.55, help='Share of colored cells')
+    parser.add_argument('--count', type=int, default=1, help='Number of puzzles to generate')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed, for reproducible puzzles')
+    parser.add_argument('--solutions', action='store_true',
+                        help='Also write the grid each puzzle was made from as a .solution file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    size = args.size[:1] if args.grid_type == 'tri' else args.size
+    os.makedirs(args.output_dir, exist_ok=True)
+    for i in range(args.count):
+        name = f"random-{'x'.join(map(str, size))}-{args.colors}c-{i + 1}"
+        nonogram, grid = random_puzzle(size, args.colors, args.density, rng, name, args.grid_type)
+        path = os.path.join(args.output_dir, f"{name}.clues")
+        with open(path, 'w') as f:
+            f.write(nonogram.to_text())
+        if args.solutions:
+            save_solution(grid, os.path.join(args.output_dir, f"{name}.solution"))
+        print(f"Wrote {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+from bisect import bisect_right
+from functools import lru_cache
+import numpy as np
+
+# Grid types and the directions of their lines, in clue file order
+GRID_DIRECTIONS = {
+    'rect': ('row', 'col'),
+    'tri': ('row', 'left', 'right'),
+}
+
+class GridShape:
+    """Cells and lines of a puzzle grid.
+
+    Cells are numbered row by row from 0, and solutions are stored as rows
+    of row_lengths[r] cells. A line is an ordered array of cell numbers
+    that one clue describes; lines[direction][index] holds them for every
+    direction of the grid type.
+
+    A 'tri' grid of size n is a triangle pointing up, cut into n rows of
+    2r + 1 small triangles each (alternating up and down, starting with
+    an up triangle). Besides the rows it has the 'left' and 'right' lines,
+    the strips parallel to the left and right edge of the triangle, read
+    from top to bottom and numbered starting at that edge."""
+
+    __slots__ = ('grid_type', 'size', 'row_lengths', 'row_offsets', 'num_cells', 'lines', 'cell_lines')
+
+    def __init__(self, grid_type, size, row_lengths, lines):
+        self.grid_type = grid_type
+        self.size = size
+        self.row_lengths = tuple(row_lengths)
+        self.row_offsets = tuple(np.concatenate([[0], np.cumsum(row_lengths)]).tolist())
+        self.num_cells = self.row_offsets[-1]
+        self.lines = lines
+
+        # The lines through each cell, for propagating changes
+        self.cell_lines = [[] for _ in range(self.num_cells)]
+        for direction, direction_lines in lines.items():
+            for index, cells in enumerate(direction_lines):
+                for cell in cells.tolist():
+                    self.cell_lines[cell].append((direction, index))
+
+    @property
+    def directions(self):
+        return GRID_DIRECTIONS[self.grid_type]
+
+    def iter_lines(self):
+        """Yield (direction, index, cells) for every line in clue order"""
+        for direction in self.directions:
+            for index, cells in enumerate(self.lines[direction]):
+                yield direction, index, cells
+
+    def position(self, cell):
+        """Row and position within the row of a cell number"""
+        r = bisect_right(self.row_offsets, cell) - 1
+        return r, cell - self.row_offsets[r]
+
+    def split_rows(self, values):
+        """Split a flat sequence of cell values into solution rows"""
+        return [list(values[start:end]) for start, end in zip(self.row_offsets, self.row_offsets[1:])]
+
+def _rect_shape(height, width):
+    cells = np.arange(height * width).reshape(height, width)
+    return GridShape('rect', (height, width), [width] * height,
+                     {'row': list(cells), 'col': list(cells.T)})
+
+def _tri_shape(n):
+    def up(r, j):
+        return r * r + 2 * j
+
+    def down(r, j):
+        # Between up(r, j) and up(r, j + 1)
+        return r * r + 2 * j + 1
+
+    rows = [np.arange(r * r, (r + 1) * (r + 1)) for r in range(n)]
+    left = []
+    for b in range(n):
+        cells = [up(b, b)]
+        for r in range(b + 1, n):
+            cells += [down(r, b), up(r, b)]
+        left.append(np.array(cells))
+    right = []
+    for c in range(n):
+        cells = [up(c, 0)]
+        for r in range(c + 1, n):
+            cells += [down(r, r - c - 1), up(r, r - c)]
+        right.append(np.array(cells))
+    return GridShape('tri', (n,), [2 * r + 1 for r in range(n)],
+                     {'row': rows, 'left': left, 'right': right})
+
+@lru_cache(maxsize=None)
+def grid_shape(grid_type, size):
+    """The GridShape of a grid type and size, computed once per shape.
+
+    size is (height, width) for 'rect' and (n,) for 'tri'."""
+    if grid_type == 'rect':
+        return _rect_shape(*size)
+    if grid_type == 'tri':
+        return _tri_shape(*size)
+    raise ValueError(f"unsupported grid type '{grid_type}'")
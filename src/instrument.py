@@ -0,0 +1,64 @@
+import json
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+# Phases of the solve pipeline, in the order they run
+PHASES = ('parse', 'propagate', 'encode', 'load', 'solve', 'diagnose', 'decode', 'save', 'render')
+
+class Recorder:
+    """Collects per-phase timings and counters for one puzzle.
+
+    Phases are timed with perf_counter; timing the same phase again adds
+    to its total. Counters hold plain numbers such as the formula size or
+    the solver statistics."""
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self, name):
+        return self.phases.get(name, 0.0)
+
+    def count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def update(self, counters):
+        """Add a dict of counters, e.g. from Solver.accum_stats()"""
+        for name, value in counters.items():
+            self.count(name, value)
+
+    def record(self, **fields):
+        """The collected measurements as one JSON serializable dict"""
+        phases = {name: round(self.phases[name], 6) for name in PHASES if name in self.phases}
+        phases.update({name: round(t, 6) for name, t in self.phases.items() if name not in phases})
+        return dict(fields, phases=phases, counters=dict(self.counters))
+
+class JsonLinesSink:
+    """Appends records as JSON lines to a file, or to stdout for '-'.
+
+    Each record is written with a single call, so workers of a batch run
+    can share the same file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        if self.path == '-':
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            return
+        with open(self.path, 'a') as f:
+            f.write(line)
@@ -0,0 +1,145 @@
+from collections import deque
+
+# Cells are tracked as bitmasks of the colors they can still take:
+# bit 0 is the background, bit i is color i ('a' = 1, 'b' = 2, ...)
+BACKGROUND = 1
+
+def color_name(index):
+    """Map a color index back to its solution character"""
+    return '-' if index == 0 else chr(ord('a') + index - 1)
+
+def solve_line(clues, masks):
+    """Solve a single line given its clues and the current cell masks.
+
+    clues is a list of (length, color index) pairs. Returns (masks, starts)
+    where masks are the narrowed cell masks and starts[b] lists the feasible
+    start positions of block b, or None if the clues cannot be placed in
+    the line at all."""
+    n = len(masks)
+    k = len(clues)
+    lengths = [block_len for block_len, _ in clues]
+    colors = [color for _, color in clues]
+    # Blocks of the same color need a space in front of them
+    gaps = [0] + [1 if colors[b] == colors[b - 1] else 0 for b in range(1, k)] + [0]
+
+    # allowed[c][i] counts the cells in [0, i) that may take color c
+    allowed = {}
+    for c in set(colors) | {0}:
+        bit = 1 << c
+        counts = [0] * (n + 1)
+        for i in range(n):
+            counts[i + 1] = counts[i] + (1 if masks[i] & bit else 0)
+        allowed[c] = counts
+
+    def fits(c, start, end):
+        # All cells in [start, end) may take color c
+        return allowed[c][end] - allowed[c][start] == end - start
+
+    # fwd[b][i]: blocks 0..b-1 fit in [0, i), the rest of [0, i) is background
+    fwd = [[False] * (n + 1) for _ in range(k + 1)]
+    fwd[0][0] = True
+    for i in range(1, n + 1):
+        fwd[0][i] = fwd[0][i - 1] and bool(masks[i - 1] & BACKGROUND)
+    for b in range(1, k + 1):
+        block_len, c, gap = lengths[b - 1], colors[b - 1], gaps[b - 1]
+        for i in range(1, n + 1):
+            if fwd[b][i - 1] and masks[i - 1] & BACKGROUND:
+                fwd[b][i] = True
+                continue
+            s = i - block_len
+            if s - gap >= 0 and fits(c, s, i) and fits(0, s - gap, s) and fwd[b - 1][s - gap]:
+                fwd[b][i] = True
+
+    # bwd[b][i]: blocks b..k-1 fit in [i, n), the rest of [i, n) is background
+    bwd = [[False] * (n + 1) for _ in range(k + 1)]
+    bwd[k][n] = True
+    for i in range(n - 1, -1, -1):
+        bwd[k][i] = bwd[k][i + 1] and bool(masks[i] & BACKGROUND)
+    for b in range(k - 1, -1, -1):
+        block_len, c, gap = lengths[b], colors[b], gaps[b + 1]
+        for i in range(n - 1, -1, -1):
+            if bwd[b][i + 1] and masks[i] & BACKGROUND:
+                bwd[b][i] = True
+                continue
+            e = i + block_len
+            if e + gap <= n and fits(c, i, e) and fits(0, e, e + gap) and bwd[b + 1][e + gap]:
+                bwd[b][i] = True
+
+    if not bwd[0][0]:
+        return None
+
+    result = [0] * n
+
+    # Cells that can lie between block b-1 and block b
+    for i in range(n):
+        if masks[i] & BACKGROUND and any(fwd[b][i] and bwd[b][i + 1] for b in range(k + 1)):
+            result[i] |= BACKGROUND
+
+    # Feasible block placements
+    starts = []
+    for b in range(k):
+        block_len, c, gap, gap_after = lengths[b], colors[b], gaps[b], gaps[b + 1]
+        block_starts = []
+        for s in range(gap, n - block_len - gap_after + 1):
+            e = s + block_len
+            if (fwd[b][s - gap] and fits(0, s - gap, s) and fits(c, s, e)
+                    and fits(0, e, e + gap_after) and bwd[b + 1][e + gap_after]):
+                block_starts.append(s)
+                for i in range(s, e):
+                    result[i] |= 1 << c
+        starts.append(block_starts)
+
+    return result, starts
+
+class LineSolver:
+    def __init__(self, nonogram):
+        self.nonogram = nonogram
+        self.shape = nonogram.shape
+        full = (1 << len(nonogram.colors)) - 1
+        # Color masks of the cells by cell number, see GridShape
+        self.masks = [full] * self.shape.num_cells
+
+    def propagate(self):
+        """Run line solving over all lines to a fixpoint.
+
+        Returns the list of cell masks, or None if the clues contradict."""
+        lines = {(direction, index): cells.tolist() for direction, index, cells in self.shape.iter_lines()}
+        queue = deque(lines)
+        queued = set(queue)
+
+        while queue:
+            line = queue.popleft()
+            queued.discard(line)
+            direction, index = line
+            cells = lines[line]
+
+            solved = solve_line(self.nonogram.clues[direction][index].tolist(),
+                                [self.masks[cell] for cell in cells])
+            if solved is None:
+                return None
+
+            for cell, mask in zip(cells, solved[0]):
+                if mask == self.masks[cell]:
+                    continue
+                self.masks[cell] = mask
+                # The crossing lines have to be looked at again
+                for crossing in self.shape.cell_lines[cell]:
+                    if crossing != line and crossing not in queued:
+                        queued.add(crossing)
+                        queue.append(crossing)
+
+        return self.masks
+
+    def is_solved(self):
+        """Check whether every cell has a single color left"""
+        return all(mask & (mask - 1) == 0 for mask in self.masks)
+
+    def unknown_cells(self):
+        """Count the cells that still have more than one color left"""
+        return sum(1 for mask in self.masks if mask & (mask - 1))
+
+    def solution(self):
+        """Return the grid as a solution, with '?' for undetermined cells"""
+        return self.shape.split_rows([
+            color_name(mask.bit_length() - 1) if mask & (mask - 1) == 0 else '?' for mask in self.masks
+        ])
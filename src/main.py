@@ -1,106 +1,527 @@
 import os
 import argparse
-import time
-import glob
-from src.nonogram import Nonogram
-from src.sat_encoder import SATEncoder
-from src.solver import NonogramSolver
-from src.visualize import visualize_solution
-
-def save_solution(solution, filename):
-    """Save the solution to a file"""
-    with open(filename, 'w') as f:
-        for row in solution:
-            f.write(''.join(row) + '\n')
-
-def print_solution(solution):
-    """Print the solution in a readable format"""
-    for row in solution:
-        print(''.join(row))
-
-def solve_nonogram(clue_file, output_dir=None, verbose=False):
-    # Parse the clue file
-    nonogram = Nonogram.parse_file(clue_file)
-    
-    # DEBUG: Print the parsed nonogram
-    print("Parsed nonogram:")
-    print(f"Grid: {nonogram.grid_type} {nonogram.height}x{nonogram.width}")
-    print(f"Colors: {nonogram.colors}")
-    print("Row clues:")
-    for i, clue in enumerate(nonogram.row_clues):
-        print(f"  Row {i}: {clue}")
-    print("Column clues:")
-    for i, clue in enumerate(nonogram.col_clues):
-        print(f"  Col {i}: {clue}")
+import csv
+import logging
+from time import perf_counter
+from src.nonogram import Nonogram, load_directory
+from src.sat_encoder import SATEncoder, ENCODINGS
+from src.line_solver import LineSolver
+from src.portfolio import DEFAULT_ENGINES, engine_name, engine_list
+from src.render import RENDER_MODES, render_solution, BackgroundRenderer
+from src.instrument import Recorder, JsonLinesSink
+from src.solution import solution_text, save_solution, print_solution
+
+# pysat (src.solver), sqlite (src.cache) and multiprocessing (src.batch) are
+# imported where they are used, so small puzzles that line solving alone
+# solves start up without them; benchmark.py --startup checks the budget
+
+log = logging.getLogger(__name__)
+
+# SAT attempts after the configured one when the search has a budget, as
+# (encoding, pysat engine): the compact ladder encoding on a stronger engine.
+# The engines need interruptible solve_limited support, which e.g. CaDiCaL
+# and Lingeling lack (see solver.unsupported_limits)
+ESCALATION = (('ladder', 'maplechrono'),)
+
+def write_outputs(name, output_dir, solution, nonogram, verbose=False, skip_unchanged=False,
+                  recorder=None, render='fast', renderer=None):
+    """Save the solution file and its visualization under the puzzle name.
+
+    With skip_unchanged, outputs already holding this solution are kept.
+    The image is drawn with the render mode (see RENDER_MODES), by the
+    BackgroundRenderer when one is given."""
+    recorder = recorder or Recorder()
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"{name}.solution")
+    image_output = os.path.join(output_dir, f"{name}.png")
+    
+    text = solution_text(solution)
+    has_image = render == 'none' or os.path.exists(image_output)
+    if skip_unchanged and has_image and os.path.exists(output_file):
+        with open(output_file) as f:
+            if f.read() == text:
+                return
+    
+    with recorder.phase('save'):
+        save_solution(solution, output_file)
+    
+    # Add visualization, with a renderer only the hand over is timed
+    with recorder.phase('render'):
+        if renderer is not None:
+            renderer.submit(solution, nonogram.colors, image_output, render, nonogram.grid_type)
+        else:
+            render_solution(solution, nonogram.colors, image_output, render, nonogram.grid_type)
     
     if verbose:
-        print(f"Solving {clue_file}...")
+        print(f"Solution saved to {output_file}")
+        print_solution(solution)
+
+def log_portfolio_result(log_file, nonogram, stats, engine, solving_time):
+    """Append the winning portfolio engine of a puzzle to a CSV log"""
+    new_file = not os.path.exists(log_file)
+    with open(log_file, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['puzzle', 'height', 'width', 'colors', 'variables', 'clauses', 'engine', 'seconds'])
+        writer.writerow([nonogram.name, nonogram.height, nonogram.width,
+                         len(nonogram.colors) - 1, stats['variables'], stats['clauses'],
+                         engine, f"{solving_time:.3f}"])
+
+def solve_puzzle(nonogram, verbose=False, encoding='pairwise', propagate=True,
+                 solver_name='glucose3', portfolio=None, max_solutions=None, recorder=None,
+                 break_symmetry=False, time_limit=None, conflict_limit=None, diagnose=True):
+    """Solve a parsed nonogram, returns (solution or None, stats).
+
+    With max_solutions, up to that many distinct solutions are counted in
+    stats['solutions'] (stats['solution_limit'] records the limit), with
+    break_symmetry mirror images of the clues are excluded from the search
+    and counted instead. Phase timings and solver counters go to recorder
+    when one is given.
+
+    time_limit (seconds for the whole puzzle) and conflict_limit (per SAT
+    call) bound the search, which then climbs the strategy ladder: line
+    solving, the SAT attempt as configured, then the ESCALATION attempts,
+    each given an equal share of the time left. If none finishes,
+    stats['status'] is 'unknown' and stats['partial_solution'] holds the
+    grid line solving determined, with '?' for the unknown cells.
+
+    With diagnose, a puzzle without solution gets stats['conflict'], the
+    (direction, index) lines of a minimal set of contradicting clues (see
+    diagnose_conflict)."""
+    if max_solutions is not None and max_solutions < 1:
+        raise ValueError(f"max_solutions must be at least 1, got {max_solutions}")
+    recorder = recorder or Recorder()
+    stats = {}
+    if max_solutions is not None:
+        stats['solution_limit'] = max_solutions
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    
+    # Fix the cells that line solving alone determines
+    known = None
+    line_solver = None
+    if propagate:
+        with recorder.phase('propagate'):
+            line_solver = LineSolver(nonogram)
+            known = line_solver.propagate()
+        stats['propagation_time'] = recorder.elapsed('propagate')
+        
+        if verbose:
+            print(f"Propagation time: {stats['propagation_time']:.3f} seconds")
+        
+        if known is None:
+            stats['status'] = 'unsat'
+            if max_solutions is not None:
+                stats['solutions'] = 0
+            if diagnose:
+                diagnose_conflict(nonogram, stats, recorder, solver_name, deadline, conflict_limit)
+            return None, stats
+        
+        stats['unknown_cells'] = line_solver.unknown_cells()
+        if verbose:
+            print(f"Unknown cells after propagation: {stats['unknown_cells']}")
+        
+        if line_solver.is_solved():
+            # No SAT call needed, and line solving only makes forced
+            # deductions, so the solution is unique
+            stats['status'] = 'sat'
+            if max_solutions is not None:
+                stats['solutions'] = 1
+            return line_solver.solution(), stats
+    
+    attempts = [(encoding, solver_name, portfolio)]
+    if (time_limit is not None or conflict_limit is not None) and max_solutions is None:
+        attempts += [(rung_encoding, rung_solver, None) for rung_encoding, rung_solver in ESCALATION
+                     if (rung_encoding, rung_solver, None) != attempts[0]]
+    
+    solution = status = None
+    for i, (attempt_encoding, attempt_solver, attempt_portfolio) in enumerate(attempts):
+        if deadline is not None and perf_counter() >= deadline:
+            break
+        attempt_time = None if deadline is None else max(deadline - perf_counter(), 0.0) / (len(attempts) - i)
+        if i > 0 and verbose:
+            print(f"Escalating to {attempt_encoding} encoding with {attempt_solver}")
+        try:
+            solution, status = _solve_sat(nonogram, known, stats, recorder, verbose, attempt_encoding,
+                                          attempt_solver, attempt_portfolio, max_solutions, break_symmetry,
+                                          attempt_time, conflict_limit)
+        except (NotImplementedError, ValueError) as e:
+            # An escalation engine that this pysat build cannot run or limit
+            if i == 0:
+                raise
+            log.warning("Skipping %s with %s: %s", attempt_encoding, attempt_solver, e)
+            continue
+        # A count cut short still has the solutions found so far
+        if status != 'unknown' or solution is not None:
+            break
+    
+    if status is None or (status == 'unknown' and solution is None):
+        # No attempt finished, fall back to what line solving determined
+        stats['status'] = 'unknown'
+        if max_solutions is not None:
+            stats['solutions'] = 0
+        if line_solver is None:
+            line_solver = LineSolver(nonogram)
+            line_solver.propagate()
+        stats['partial_solution'] = line_solver.solution()
+        if verbose:
+            print("Search budget exhausted, returning the partial grid")
+        return None, stats
+    
+    stats['status'] = status
+    if status == 'unsat' and solution is None and diagnose:
+        diagnose_conflict(nonogram, stats, recorder, solver_name, deadline, conflict_limit)
+    return solution, stats
+
+def diagnose_conflict(nonogram, stats, recorder, solver_name='glucose3', deadline=None, conflict_limit=None):
+    """Find the lines whose clues contradict each other, into stats['conflict'].
+
+    Only runs once a puzzle has no solution, so solving is not slowed
+    down: the puzzle is encoded again with every line behind a selector
+    literal (see SolveSession) and the unsat core is minimized. The
+    diagnosis shares the search budget of the puzzle, deadline (a
+    perf_counter() time) and conflict_limit per SAT call; when it runs
+    out the core is left as minimized so far, or there is no diagnosis."""
+    if deadline is not None and perf_counter() >= deadline:
+        return
+    from src.session import SolveSession
+    with recorder.phase('diagnose'):
+        with SolveSession(nonogram, solver_name=solver_name) as session:
+            if session.solve(deadline, conflict_limit) is None and session.status == 'unsat':
+                stats['conflict'] = session.conflict(deadline=deadline, conflict_limit=conflict_limit)
+    stats['diagnosis_time'] = recorder.elapsed('diagnose')
+
+def _solve_sat(nonogram, known, stats, recorder, verbose, encoding, solver_name, portfolio,
+               max_solutions, break_symmetry, time_limit, conflict_limit):
+    """Encode and solve once, returns (solution or None, status).
+
+    status is that of NonogramSolver, or 'unknown' when encoding alone
+    used up time_limit. stats gets the formula size and times."""
+    from src.solver import NonogramSolver
+    start = perf_counter()
     
     # Encode the puzzle
-    start_time = time.time()
-    encoder = SATEncoder(nonogram)
-    cnf, var_mapping = encoder.encode_block_start()
-    encoding_time = time.time() - start_time
+    with recorder.phase('encode'):
+        encoder = SATEncoder(nonogram, mode=encoding)
+        cnf, layout = encoder.encode(known=known)
+        symmetries = encoder.symmetries() if break_symmetry and max_solutions is not None else []
+        if symmetries:
+            encoder.break_symmetries(symmetries)
+    stats['encoding_time'] = recorder.elapsed('encode')
+    stats.update(encoder.stats())
+    if symmetries:
+        stats['symmetries'] = len(symmetries)
+    recorder.count('variables', stats['variables'])
+    recorder.count('clauses', stats['clauses'])
     
     if verbose:
-        print(f"Encoding time: {encoding_time:.3f} seconds")
-        print(f"Variables: {cnf.nv}, Clauses: {len(cnf.clauses)}")
+        print(f"Encoding time: {stats['encoding_time']:.3f} seconds")
+        print(f"Encoding: {stats['mode']}, Variables: {stats['variables']}, Clauses: {stats['clauses']}")
+    
+    # Loading a formula into the engine cannot be interrupted either
+    if time_limit is not None and perf_counter() - start >= time_limit:
+        return None, 'unknown'
     
     # Solve the puzzle
-    start_time = time.time()
-    solver = NonogramSolver(cnf, var_mapping)
-    model = solver.solve()
-    solving_time = time.time() - start_time
+    with recorder.phase('load'):
+        solver = NonogramSolver(cnf, layout, solver_name=solver_name, portfolio=portfolio)
+    with recorder.phase('solve'):
+        if max_solutions is not None:
+            models = solver.solve(max_solutions, symmetries, time_limit, conflict_limit)
+            model = models[0] if models else None
+            stats['solutions'] = min(solver.solution_count, max_solutions)
+        else:
+            model = solver.solve(time_limit=time_limit, conflict_limit=conflict_limit)
+    stats['solving_time'] = recorder.elapsed('load') + recorder.elapsed('solve')
+    stats['engine'] = solver.engine
+    recorder.update(solver.stats())
     
     if verbose:
-        print(f"Solving time: {solving_time:.3f} seconds")
+        print(f"Solving time: {stats['solving_time']:.3f} seconds")
+        if portfolio and max_solutions is None:
+            print(f"Portfolio winner: {solver.engine}")
     
-    # Extract and save the solution
     if model:
-        solution = solver.extract_solution(model, nonogram)
+        with recorder.phase('decode'):
+            return solver.extract_solution(model, nonogram), solver.status
+    return None, solver.status
+
+def describe_solution_count(stats):
+    """Summarize the solution count of an enumeration"""
+    count, limit = stats['solutions'], stats['solution_limit']
+    if stats.get('status') == 'unknown':
+        if count == 0:
+            return "Unknown, search budget exhausted"
+        return f"At least {count} solution{'s' if count > 1 else ''}, search budget exhausted"
+    if count == 0:
+        return "No solution"
+    if count == 1:
+        return "Unique solution"
+    if count >= limit:
+        return f"At least {count} solutions"
+    return f"{count} solutions"
+
+def solve_nonogram(clue_file, output_dir=None, verbose=False, **options):
+    """Parse a clue file and solve its (first) puzzle, see solve_parsed"""
+    return solve_parsed(Nonogram.parse_file(clue_file), output_dir, verbose, **options)
+
+def solve_parsed(nonogram, output_dir=None, verbose=False, encoding='pairwise', propagate=True,
+                 solver_name='glucose3', portfolio=None, portfolio_log=None, cache_dir=None,
+                 max_solutions=None, stats_file=None, render='fast', renderer=None,
+                 break_symmetry=False, time_limit=None, conflict_limit=None, diagnose=True,
+                 bulk_output=None):
+    """Solve a parsed nonogram and write its outputs, returns (solved, solution).
+
+    With stats_file, the phase timings and solver counters of the puzzle
+    are appended to it as a JSON line ('-' for stdout). render and
+    renderer are passed on to write_outputs. When time_limit or
+    conflict_limit cut the search short (see solve_puzzle), the partial
+    grid is written to a .partial file instead of the solution. With
+    bulk_output, the solution is appended to that bulk file (see
+    src.bulk) instead of writing files and an image to output_dir,
+    unless the file already holds it."""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Parsed nonogram %s: %s %s, colors %s", nonogram.name, nonogram.grid_type,
+                  'x'.join(map(str, nonogram.size)), nonogram.colors)
+        for direction, i, _, clue in nonogram.lines():
+            log.debug("%s %d: %s", direction, i, clue.tolist())
+    
+    recorder = Recorder()
+    if nonogram.parse_time is not None:
+        recorder.add_time('parse', nonogram.parse_time)
+    
+    if verbose:
+        print(f"Solving {nonogram.name}...")
+    
+    cache = None
+    if cache_dir:
+        from src.cache import SolutionCache
+        cache = SolutionCache(cache_dir)
+    cached = cache.get(nonogram) if cache else None
+    
+    if cached is not None and max_solutions is not None:
+        # Only reuse an entry that already counted far enough
+        cached_stats = cached[2]
+        counted = 'solutions' in cached_stats and (
+            cached_stats['solution_limit'] >= max_solutions
+            or cached_stats['solutions'] < cached_stats['solution_limit'])
+        if not counted:
+            cached = None
+    
+    if cached is not None:
+        solved, solution, stats = cached
+        if verbose:
+            print("Answered from cache")
+    else:
+        solution, stats = solve_puzzle(nonogram, verbose, encoding, propagate, solver_name, portfolio,
+                                       max_solutions, recorder, break_symmetry, time_limit, conflict_limit,
+                                       diagnose)
+        solved = solution is not None
+        # An exhausted budget says nothing lasting about the puzzle
+        if cache and stats.get('status') != 'unknown':
+            cache.put(nonogram, solved, solution, stats)
         
+        if portfolio and portfolio_log and stats.get('engine'):
+            log_portfolio_result(portfolio_log, nonogram, stats, stats['engine'],
+                                 stats['solving_time'])
+    
+    if cache:
+        cache.close()
+    
+    if max_solutions is not None:
+        count = describe_solution_count(stats)
+        if 'solving_time' in stats:
+            count += f" ({stats['solving_time']:.3f} seconds)"
+        print(f"{nonogram.name}: {count}")
+    
+    # Save the solution
+    if solved:
+        if bulk_output:
+            from src.bulk import bulk_writer
+            with recorder.phase('save'):
+                appended = bulk_writer(bulk_output).append(nonogram, solution)
+            if verbose:
+                print(f"Solution appended to {bulk_output}" if appended
+                      else f"Solution already in {bulk_output}")
+        elif output_dir:
+            write_outputs(nonogram.name, output_dir, solution, nonogram, verbose,
+                          skip_unchanged=cached is not None, recorder=recorder,
+                          render=render, renderer=renderer)
+            # Drop the partial grid of an earlier run with a smaller budget
+            partial_file = os.path.join(output_dir, f"{nonogram.name}.partial")
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+    elif 'partial_solution' in stats:
+        partial = stats['partial_solution']
+        unknown = sum(row.count('?') for row in partial)
+        message = f"{nonogram.name}: search budget exhausted, {unknown} cells unknown"
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
-            base_name = os.path.basename(clue_file)
-            name, _ = os.path.splitext(base_name)
-            output_file = os.path.join(output_dir, f"{name}.solution")
-            save_solution(solution, output_file)
-            
-            # Add visualization
-            image_output = os.path.join(output_dir, f"{name}.png")
-            visualize_solution(solution, nonogram.colors, image_output)
-            
-            if verbose:
-                print(f"Solution saved to {output_file}")
-                print_solution(solution)
-        
-        return True, solution
-    else:
+            partial_file = os.path.join(output_dir, f"{nonogram.name}.partial")
+            save_solution(partial, partial_file)
+            message += f", partial grid saved to {partial_file}"
+        print(message)
         if verbose:
-            print("No solution found.")
-        return False, None
+            print_solution(partial)
+    elif stats.get('conflict'):
+        lines = ', '.join(f"{direction} {index}" for direction, index in stats['conflict'])
+        print(f"{nonogram.name}: no solution, conflicting clues in {lines}")
+    elif verbose:
+        print("No solution found.")
+    
+    if stats_file:
+        JsonLinesSink(stats_file)(recorder.record(
+            puzzle=nonogram.name, source=nonogram.source, height=nonogram.height,
+            width=nonogram.width, colors=len(nonogram.colors) - 1, solved=solved,
+            cached=cached is not None, encoding=stats.get('mode'), engine=stats.get('engine'),
+            status=stats.get('status'), conflict=stats.get('conflict'),
+        ))
+    
+    return (True, solution) if solved else (False, None)
+
+def positive_int(text):
+    """Command line type of counts that must be at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid count '{text}'") from None
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a count of at least 1, got {value}")
+    return value
+
+def parse_sizes(text):
+    """Comma separated grid sizes for --stress, see generator.parse_size"""
+    from src.generator import parse_size
+    return [parse_size(part) for part in text.split(',')]
 
 def main():
     """Main entry point for the nonogram solver"""
     parser = argparse.ArgumentParser(description='Solve nonogram puzzles using SAT techniques')
-    parser.add_argument('--input-dir', required=True, help='Directory containing .clues files')
+    parser.add_argument('--input-dir', help='Directory containing .clues files')
     parser.add_argument('--output-dir', default='solutions', help='Directory to save solution files')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='pairwise',
+                        help='Constraint encoding used for the SAT formula')
+    parser.add_argument('--no-propagate', action='store_true',
+                        help='Skip the line solving pass before SAT encoding')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of puzzles to solve in parallel worker processes')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Per-puzzle time limit in seconds (runs puzzles in worker processes)')
+    # No string default, argparse would check it and load pysat on every run
+    parser.add_argument('--solver', type=engine_name, default=None,
+                        help='pysat engine used to solve the formula (default: glucose3)')
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='Search budget per puzzle in seconds; escalates through stronger strategies '
+                             'and writes the partial grid when it runs out')
+    parser.add_argument('--conflict-limit', type=int, default=None,
+                        help='Conflict budget per SAT call, see --time-limit')
+    parser.add_argument('--no-diagnose', action='store_true',
+                        help='Do not look for the conflicting clues of puzzles without solution')
+    parser.add_argument('--portfolio', nargs='?', type=engine_list, const=list(DEFAULT_ENGINES), default=None,
+                        help='Race a comma separated list of pysat engines in parallel '
+                             f'(default: {",".join(DEFAULT_ENGINES)})')
+    parser.add_argument('--portfolio-log', default=None,
+                        help='CSV file to append the winning portfolio engine per puzzle to')
+    parser.add_argument('--check-unique', action='store_true',
+                        help='Check whether each puzzle has exactly one solution')
+    parser.add_argument('--max-solutions', type=positive_int, default=None,
+                        help='Count up to this many distinct solutions per puzzle')
+    parser.add_argument('--break-symmetry', action='store_true',
+                        help='Skip mirror images of solutions of symmetric clues when counting solutions')
+    parser.add_argument('--cache-dir', default='.nonogram_cache',
+                        help='Directory of the solution cache')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the solution cache')
+    parser.add_argument('--stats-file', default=None,
+                        help="Append per-puzzle phase timings and solver counters as JSON lines ('-' for stdout)")
+    parser.add_argument('--bulk-output', default=None,
+                        help='Append all solutions to this one bulk file instead of writing .solution and '
+                             'image files (read it with python -m src.bulk)')
+    parser.add_argument('--render', choices=RENDER_MODES, default='fast',
+                        help='How solution images are drawn: none, a fast built-in PNG writer or matplotlib')
+    parser.add_argument('--stress', type=parse_sizes, default=None, metavar='SIZES',
+                        help='Instead of solving files, time random puzzles of these comma separated '
+                             'sizes, e.g. 25,50,100x120')
+    parser.add_argument('--stress-colors', type=int, default=2, help='Number of colors of the stress puzzles')
+    parser.add_argument('--stress-density', type=float, default=0.55,
+                        help='Share of colored cells of the stress puzzles')
+    parser.add_argument('--stress-limit', type=float, default=60,
+                        help='Skip the larger stress sizes once a size takes longer than this many seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the stress puzzles')
+    parser.add_argument('--log-level', default='warning',
+                        choices=['debug', 'info', 'warning', 'error'],
+                        help='Level of the diagnostic log output')
     
     args = parser.parse_args()
+    args.solver = args.solver or 'glucose3'
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s: %(name)s: %(message)s')
+    
+    if args.stress:
+        # Imported here, the benchmark module imports this one
+        from src.benchmark import stress, print_stress
+        results = stress(args.stress, args.stress_colors, args.stress_density, args.encoding,
+                         not args.no_propagate, args.solver, args.seed, limit=args.stress_limit)
+        print_stress(results)
+        if len(results) < len(args.stress):
+            print(f"Skipped {len(args.stress) - len(results)} larger sizes, "
+                  f"{results[-1]['name']} took longer than {args.stress_limit:g} seconds")
+        return
+    if args.input_dir is None:
+        parser.error('--input-dir is required unless --stress is given')
+    if not args.portfolio and (args.time_limit is not None or args.conflict_limit is not None):
+        from src.solver import unsupported_limits
+        unsupported = unsupported_limits(args.solver, args.time_limit, args.conflict_limit)
+        if unsupported:
+            flags = ', '.join('--' + name.replace('_', '-') for name in unsupported)
+            parser.error(f"--solver {args.solver} cannot enforce {flags}, choose another engine")
+    
+    # Load all puzzles of the .clues files in the input directory
+    errors = []
+    puzzles = list(load_directory(args.input_dir, errors=errors))
     
-    # Find all .clues files in the input directory
-    clue_files = glob.glob(os.path.join(args.input_dir, "*.clues"))
+    for path, message in errors:
+        print(f"Skipping {path}: {message}")
     
-    if not clue_files:
+    if not puzzles:
         print(f"No .clues files found in {args.input_dir}")
         return
     
     if args.verbose:
-        print(f"Found {len(clue_files)} nonogram puzzles to solve")
+        print(f"Found {len(puzzles)} nonogram puzzles to solve")
+    
+    options = {
+        'output_dir': args.output_dir,
+        'verbose': args.verbose,
+        'encoding': args.encoding,
+        'propagate': not args.no_propagate,
+        'solver_name': args.solver,
+        'portfolio': args.portfolio,
+        'portfolio_log': args.portfolio_log,
+        'cache_dir': None if args.no_cache else args.cache_dir,
+        'max_solutions': args.max_solutions or (2 if args.check_unique else None),
+        'stats_file': args.stats_file,
+        'render': args.render,
+        'break_symmetry': args.break_symmetry,
+        'time_limit': args.time_limit,
+        'conflict_limit': args.conflict_limit,
+        'diagnose': not args.no_diagnose,
+        'bulk_output': args.bulk_output,
+    }
+    
+    if args.jobs > 1 or args.timeout is not None:
+        from src.batch import run_batch, print_summary
+        start_time = perf_counter()
+        tasks = [(puzzle.name, puzzle) for puzzle in puzzles]
+        results = run_batch(tasks, solve_parsed, jobs=args.jobs, timeout=args.timeout, **options)
+        print_summary(results, perf_counter() - start_time)
+        return
     
-    for clue_file in clue_files:
-        solve_nonogram(clue_file, args.output_dir, args.verbose)
+    # Draw the images of one puzzle while the next one is solved
+    renderer = BackgroundRenderer()
+    try:
+        for puzzle in puzzles:
+            solve_parsed(puzzle, renderer=renderer, **options)
+    finally:
+        renderer.close()
 
 if __name__ == '__main__':
     main()
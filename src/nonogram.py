@@ -1,69 +1,233 @@
+import os
+import re
+import glob
+from time import perf_counter
+import numpy as np
+from src.grid import GRID_DIRECTIONS, grid_shape
+from src.solution import solution_cells
+
+# Grid types the parser accepts
+GRID_TYPES = tuple(GRID_DIRECTIONS)
+
+# One block of a clue, e.g. '12b'
+CLUE_BLOCK = re.compile(r'(\d+)([a-z])')
+
 class Nonogram:
     def __init__(self):
-        self.grid_type = None  # 'rect' or 'tri'
+        self.grid_type = None  # one of GRID_TYPES
         self.height = 0
-        self.width = 0
+        self.width = 0  # of the bounding box for 'tri'
         self.colors = []
-        self.row_clues = []
-        self.col_clues = []
-    
+        # Per direction of the grid (see GRID_DIRECTIONS) one int16 array
+        # of (length, color index) rows per line, 'a' = 1
+        self.clues = {}
+        self.name = None
+        self.source = None
+        self.parse_time = None  # seconds spent parsing and validating
+
+    @property
+    def row_clues(self):
+        return self.clues.get('row', [])
+
+    @row_clues.setter
+    def row_clues(self, clues):
+        self.clues['row'] = clues
+
+    @property
+    def col_clues(self):
+        return self.clues.get('col', [])
+
+    @col_clues.setter
+    def col_clues(self, clues):
+        self.clues['col'] = clues
+
+    @property
+    def size(self):
+        """Size of the grid as grid_shape() takes it"""
+        return (self.height,) if self.grid_type == 'tri' else (self.height, self.width)
+
+    @property
+    def shape(self):
+        return grid_shape(self.grid_type, self.size)
+
+    def lines(self):
+        """Yield (direction, index, cells, clue) for every line in clue order"""
+        for direction, index, cells in self.shape.iter_lines():
+            yield direction, index, cells, self.clues[direction][index]
+
     @staticmethod
     def parse_file(filename):
-        """Parse a nonogram file and return a Nonogram object"""
+        """Parse a nonogram file and return a Nonogram object.
+
+        For a bundle of several puzzles this is the first one."""
+        for nonogram in iter_puzzles(filename):
+            return nonogram
+        raise ValueError(f"{filename}: no puzzle found")
+
+    @staticmethod
+    def from_grid(grid, colors, name=None, grid_type='rect'):
+        """Build the nonogram whose solution is grid.
+
+        grid is a list of rows of solution characters ('-', 'a', 'b', ...)
+        and colors the background color followed by one color per letter.
+        For 'tri' row r holds 2r + 1 cells."""
         nonogram = Nonogram()
-        
-        with open(filename, 'r') as f:
-            lines = [line.strip() for line in f.readlines()]
-            
-            # Parse grid type
-            grid_info = lines[0].split()
-            if grid_info[0] == 'rect':
-                nonogram.grid_type = 'rect'
-                nonogram.height = int(grid_info[1])
-                nonogram.width = int(grid_info[2])
-            
-            # Parse colors
-            colors = lines[1].split()
-            nonogram.colors = colors
-            
-            # Parse clues
-            clue_lines = [line for line in lines[2:] if line.strip()]
-            
-            # Row clues come first
-            nonogram.row_clues = []
-            for i in range(min(nonogram.height, len(clue_lines))):
-                clue = parse_clue(clue_lines[i])
-                nonogram.row_clues.append(clue)
-            
-            # Then column clues
-            nonogram.col_clues = []
-            for i in range(nonogram.height, min(nonogram.height + nonogram.width, len(clue_lines))):
-                clue = parse_clue(clue_lines[i])
-                nonogram.col_clues.append(clue)
-            
-            # Fill in empty clues if necessary
-            while len(nonogram.row_clues) < nonogram.height:
-                nonogram.row_clues.append([])
-            
-            while len(nonogram.col_clues) < nonogram.width:
-                nonogram.col_clues.append([])
-        
+        nonogram.grid_type = grid_type
+        nonogram.height = len(grid)
+        nonogram.width = len(grid[-1]) if grid else 0
+        nonogram.colors = list(colors)
+        nonogram.name = name
+
+        shape = nonogram.shape
+        if [len(row) for row in grid] != list(shape.row_lengths):
+            raise ValueError(f"grid rows do not match a {grid_type} grid of size {nonogram.size}")
+        cells = solution_cells(grid)
+        for direction, _, line in shape.iter_lines():
+            nonogram.clues.setdefault(direction, []).append(line_clue(cells[line]))
         return nonogram
 
+    def to_text(self):
+        """The puzzle in the .clues file format, as iter_puzzles reads it"""
+        grid_line = ' '.join([self.grid_type] + [str(size) for size in self.size])
+        lines = [grid_line, ' '.join(self.colors)]
+        for direction in self.shape.directions:
+            lines.extend(clue_text(clue) for clue in self.clues[direction])
+        return '\n'.join(lines) + '\n'
+
+    def validate(self):
+        """Check that every clue fits its line and that all directions agree.
+
+        Raises ValueError for puzzles that cannot have a solution."""
+        ncolors = len(self.colors) - 1
+        for direction, i, cells, clue in self.lines():
+            if len(clue) == 0:
+                continue
+            if clue[:, 1].max() > ncolors:
+                raise ValueError(f"{self.name}: {direction} {i} uses an undefined color")
+            # Consecutive blocks of the same color need a space between them
+            needed = int(clue[:, 0].sum()) + int(np.count_nonzero(clue[1:, 1] == clue[:-1, 1]))
+            if needed > len(cells):
+                raise ValueError(f"{self.name}: {direction} {i} needs {needed} cells but has {len(cells)}")
+
+        # Every direction must color the same number of cells per color
+        first, *others = self.shape.directions
+        totals = _color_totals(self.clues[first], ncolors)
+        for direction in others:
+            if not np.array_equal(totals, _color_totals(self.clues[direction], ncolors)):
+                raise ValueError(f"{self.name}: {first} and {direction} clues color different numbers of cells")
+
+def _color_totals(clues, ncolors):
+    """Number of cells of each color over all lines"""
+    blocks = np.concatenate([np.zeros((0, 2), dtype=np.int16)] + list(clues))
+    return np.bincount(blocks[:, 1], weights=blocks[:, 0], minlength=ncolors + 1)
+
+def line_clue(line):
+    """Clue of a solved line of color indices, as an int16 array like parse_clue"""
+    line = np.asarray(line)
+    # Blocks start wherever the color changes to a non background color
+    changes = np.flatnonzero(np.diff(line, prepend=0, append=0))
+    starts, ends = changes[:-1], changes[1:]
+    colors = line[starts]
+    keep = colors != 0
+    return np.stack([(ends - starts)[keep], colors[keep]], axis=1).astype(np.int16).reshape(-1, 2)
+
 def parse_clue(clue_line):
-    """Parse a clue string into a list of (count, color) tuples"""
+    """Parse a clue string into an int16 array of (length, color index) rows"""
+    blocks = []
+    for part in clue_line.split():
+        match = CLUE_BLOCK.fullmatch(part)
+        if match is None or int(match.group(1)) == 0:
+            raise ValueError(f"invalid clue block '{part}'")
+        blocks.append((int(match.group(1)), ord(match.group(2)) - ord('a') + 1))
+    return np.array(blocks, dtype=np.int16).reshape(-1, 2)
+
+def clue_text(clue):
+    """Clue string of a clue array, the inverse of parse_clue"""
+    return ' '.join(f"{length}{chr(ord('a') + color - 1)}" for length, color in clue.tolist())
+
+def iter_puzzles(filename):
+    """Parse the puzzles of a clue file one at a time.
+
+    A file may hold a bundle of puzzles, each starting with its grid line.
+    Blank lines inside a puzzle are empty clues; blank lines between
+    puzzles are skipped. Every puzzle is validated before it is yielded."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    with open(filename, 'r') as f:
+        yield from _iter_puzzles(f, stem, filename)
+
+def parse_puzzles(text, name='puzzle'):
+    """Parse the puzzles of clue text in the .clues format into a list.
+
+    The puzzles are named like those of a file called name.clues."""
+    return list(_iter_puzzles(text.splitlines(), name, None))
+
+def _iter_puzzles(lines, stem, source):
+    """Parse puzzles from an iterable of lines, see iter_puzzles"""
+    lines = enumerate(lines, 1)
+    index = 0
+    for line_number, line in lines:
+        grid_info = line.split()
+        if not grid_info:
+            continue
+        start = perf_counter()
+
+        name = stem if index == 0 else f"{stem}.{index + 1}"
+        try:
+            nonogram = _parse_puzzle(grid_info, lines)
+        except ValueError as e:
+            raise ValueError(f"{source or stem}:{line_number}: {e}") from None
+        nonogram.name = name
+        nonogram.source = source
+        nonogram.validate()
+        nonogram.parse_time = perf_counter() - start
+        index += 1
+        yield nonogram
+
+def _parse_puzzle(grid_info, lines):
+    """Parse one puzzle after its grid line from an iterator of numbered lines"""
+    nonogram = Nonogram()
+
+    # Parse grid type, 'rect <height> <width>' or 'tri <size>'
+    if grid_info[0] not in GRID_TYPES:
+        raise ValueError(f"unsupported grid type '{grid_info[0]}'")
+    sizes = 1 if grid_info[0] == 'tri' else 2
+    if len(grid_info) != sizes + 1 or not all(part.isdigit() for part in grid_info[1:]):
+        raise ValueError(f"invalid grid line '{' '.join(grid_info)}'")
+    nonogram.grid_type = grid_info[0]
+    nonogram.height = int(grid_info[1])
+    nonogram.width = int(grid_info[2]) if sizes == 2 else 2 * nonogram.height - 1
+
+    # Parse colors
+    _, colors = next(lines, (None, ''))
+    nonogram.colors = colors.split()
+    if len(nonogram.colors) < 2 or not all(color.startswith('#') for color in nonogram.colors):
+        raise ValueError("expected a line of colors")
+
+    # The clues of each direction in turn, e.g. rows then columns
+    shape = nonogram.shape
+    count = sum(len(shape.lines[direction]) for direction in shape.directions)
     clues = []
-    parts = clue_line.split()
-    
-    for part in parts:
-        i = 0
-        while i < len(part) and part[i].isdigit():
-            i += 1
-        
-        count = int(part[:i]) if i > 0 else 0
-        color = part[i:] if i < len(part) else ''
-        
-        if count > 0 and color:
-            clues.append((count, color))
-    
-    return clues
+    while len(clues) < count:
+        _, line = next(lines, (None, None))
+        if line is None:
+            raise ValueError(f"expected {count} clue lines, found {len(clues)}")
+        clues.append(parse_clue(line))
+
+    for direction in shape.directions:
+        size = len(shape.lines[direction])
+        nonogram.clues[direction], clues = clues[:size], clues[size:]
+    return nonogram
+
+def load_directory(directory, pattern='*.clues', errors=None):
+    """Parse every puzzle of the clue files in a directory.
+
+    Yields the puzzles in file name order, with bundles expanded. Files that
+    fail to parse or validate are reported in errors as (path, message)
+    when a list is given, otherwise the ValueError is raised."""
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        try:
+            yield from iter_puzzles(path)
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors.append((path, str(e)))
@@ -0,0 +1,140 @@
+import time
+import queue
+import argparse
+import warnings
+from functools import lru_cache
+
+# Engines raced by default, see pysat.solvers.SolverNames for the options
+DEFAULT_ENGINES = ('glucose4', 'cadical195', 'maplechrono', 'lingeling', 'minisat22')
+
+# Seconds between checks for engines that died without an answer
+POLL_INTERVAL = 0.1
+
+# What the --solver engine needs besides a plain solve: SolveSession and the
+# conflict diagnosis solve under assumptions and read unsat cores
+REQUIRED_FEATURES = ('assumptions', 'core')
+
+@lru_cache(maxsize=None)
+def engine_features(name):
+    """What the pysat wrapper of an engine supports, probed once on a tiny formula.
+
+    Returns a frozenset of 'interrupt' (time limits), 'conf_budget'
+    (conflict limits), 'assumptions', 'core' and 'stats'. Raises
+    ValueError if the engine cannot be created here, e.g. when the
+    package it needs is not installed."""
+    from pysat.solvers import Solver
+    try:
+        solver = Solver(name=name, bootstrap_with=[[1, 2]])
+    except Exception as e:
+        raise ValueError(f"pysat engine '{name}' is not available: {e}") from None
+
+    features = set()
+    with solver:
+        for feature, probe in (('interrupt', solver.interrupt), ('conf_budget', lambda: solver.conf_budget(-1))):
+            try:
+                probe()
+                features.add(feature)
+            except NotImplementedError:
+                pass
+        if 'interrupt' in features:
+            solver.clear_interrupt()
+        # Engines without assumptions warn and solve without them
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            try:
+                if solver.solve(assumptions=[-1, -2]) is False:
+                    features.add('assumptions')
+            except Warning:
+                pass
+        for feature, probe in (('core', solver.get_core), ('stats', solver.accum_stats)):
+            try:
+                probe()
+                features.add(feature)
+            except NotImplementedError:
+                pass
+    return frozenset(features)
+
+def _check_engine(name, required=()):
+    """name if it is a pysat engine that runs here with the required features"""
+    from pysat.solvers import SolverNames
+    known = {key: names for key, names in vars(SolverNames).items() if isinstance(names, tuple)}
+    if not any(name in names for names in known.values()):
+        canonical = [key if key in names else names[-1] for key, names in known.items()]
+        raise argparse.ArgumentTypeError(f"unknown pysat engine '{name}', expected one of {', '.join(canonical)}")
+    try:
+        features = engine_features(name)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    missing = [feature for feature in required if feature not in features]
+    if missing:
+        raise argparse.ArgumentTypeError(f"pysat engine '{name}' does not support {' or '.join(missing)}")
+    return name
+
+def engine_name(name):
+    """Command line type of the pysat engine of the solver, e.g. 'glucose3' or 'cd195'"""
+    return _check_engine(name, REQUIRED_FEATURES)
+
+def engine_list(text):
+    """Command line type of comma separated pysat engines to race.
+
+    A race only needs a plain solve of each engine."""
+    return [_check_engine(name) for name in text.split(',')]
+
+def _race(name, clauses, results):
+    """Run a single engine on the formula and report its answer"""
+    from pysat.solvers import Solver
+    start_time = time.time()
+    try:
+        with Solver(name=name, bootstrap_with=clauses) as solver:
+            if solver.solve():
+                results.put((name, True, solver.get_model(), time.time() - start_time, None))
+            else:
+                results.put((name, False, None, time.time() - start_time, None))
+    except Exception as e:
+        results.put((name, None, None, time.time() - start_time, str(e)))
+
+def solve_portfolio(clauses, engines=DEFAULT_ENGINES, timeout=None):
+    """Race several SAT engines on the same clauses in parallel processes.
+
+    The first engine to finish decides the answer and the others are
+    terminated. Returns (model, engine, seconds); model is None if the
+    formula is unsatisfiable or nobody finished within timeout, in which
+    case engine is None as well for the timeout."""
+    import multiprocessing as mp
+    ctx = mp.get_context()
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_race, args=(name, clauses, results)) for name in engines]
+    for process in processes:
+        process.start()
+
+    start_time = time.time()
+    failures = []
+    answered = set()
+    try:
+        while len(failures) < len(processes):
+            remaining = None if timeout is None else timeout - (time.time() - start_time)
+            if remaining is not None and remaining <= 0:
+                return None, None, time.time() - start_time
+            try:
+                name, satisfiable, model, elapsed, error = results.get(
+                    timeout=POLL_INTERVAL if remaining is None else min(remaining, POLL_INTERVAL))
+            except queue.Empty:
+                for name, process in zip(engines, processes):
+                    if name not in answered and not process.is_alive() and process.exitcode != 0:
+                        # Died without reporting a result, e.g. a crash in the native engine
+                        answered.add(name)
+                        failures.append(f"{name}: exit code {process.exitcode}")
+                continue
+            answered.add(name)
+            if satisfiable is None:
+                # The engine is not usable here, wait for the others
+                failures.append(f"{name}: {error}")
+                continue
+            return model, name, elapsed
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    raise RuntimeError(f"No portfolio engine could run: {'; '.join(failures)}")
@@ -0,0 +1,131 @@
+import zlib
+import struct
+import logging
+from functools import lru_cache
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from src.solution import solution_cells
+
+# Ways to draw a solution image, see render_solution
+RENDER_MODES = ('none', 'fast', 'matplotlib')
+
+# Pixels per cell of the fast renderer, including the grid line
+CELL_SIZE = 20
+
+GRID_LINE = (0, 0, 0)
+
+# Color outside the cells of non rectangular grids
+OUTSIDE = (255, 255, 255)
+
+log = logging.getLogger(__name__)
+
+def palette(colors):
+    """RGB palette of a color list like ['#ffffff', '#333333']"""
+    return np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in colors], dtype=np.uint8)
+
+def solution_image(solution, colors, cell_size=CELL_SIZE):
+    """RGB image of a solution with grid lines, as a (height, width, 3) uint8 array"""
+    height = len(solution)
+    width = len(solution[0]) if height > 0 else 0
+    cells = solution_cells(solution).reshape(height, width)
+
+    pixels = palette(colors)[cells]
+    pixels = np.repeat(np.repeat(pixels, cell_size, axis=0), cell_size, axis=1)
+
+    # One extra row and column close the grid at the bottom and right
+    image = np.empty((height * cell_size + 1, width * cell_size + 1, 3), dtype=np.uint8)
+    image[:-1, :-1] = pixels
+    image[::cell_size, :] = GRID_LINE
+    image[:, ::cell_size] = GRID_LINE
+    return image
+
+@lru_cache(maxsize=32)
+def _tri_cell_map(n, side):
+    """Cell number under every pixel of a 'tri' grid image, -1 outside.
+
+    a counts the rows from the top and b the strips parallel to the left
+    edge, both in units of one small triangle."""
+    row_height = side * 3 ** 0.5 / 2
+    height, width = int(np.ceil(n * row_height)), n * side
+    y, x = np.mgrid[0:height, 0:width] + 0.5
+    a = y / row_height
+    b = (x - width / 2) / side + a / 2
+    inside = (a < n) & (b >= 0) & (b <= a)
+
+    r = np.floor(a).astype(int)
+    j = np.clip(np.floor(b).astype(int), 0, r)
+    # A down triangle where b has gone further into its strip than a
+    down = (a - r) < (b - j)
+    cells = r * r + 2 * j + down
+    return np.where(inside, cells, -1)
+
+def tri_image(solution, colors, side=CELL_SIZE + 4):
+    """RGB image of a 'tri' solution with the triangle borders drawn"""
+    cell_map = _tri_cell_map(len(solution), side)
+    cells = solution_cells(solution)
+
+    image = palette(colors)[cells[cell_map]]
+    image[cell_map < 0] = OUTSIDE
+    # Border pixels: the cell changes to the right or below
+    border = np.zeros(cell_map.shape, dtype=bool)
+    border[:, :-1] |= cell_map[:, :-1] != cell_map[:, 1:]
+    border[:-1, :] |= cell_map[:-1, :] != cell_map[1:, :]
+    image[border] = GRID_LINE
+    return image
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk))
+
+def write_png(image, filename):
+    """Write an RGB uint8 array as a PNG file"""
+    height, width, _ = image.shape
+    # Every scanline starts with its filter type, 0 = none
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(_png_chunk(b'IHDR', header))
+        f.write(_png_chunk(b'IDAT', zlib.compress(raw.tobytes())))
+        f.write(_png_chunk(b'IEND', b''))
+
+def render_solution(solution, colors, output_file, mode='fast', grid_type='rect'):
+    """Draw a solution to a PNG file with one of RENDER_MODES"""
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode '{mode}', expected one of {RENDER_MODES}")
+    if mode == 'none':
+        return
+
+    if grid_type == 'tri':
+        if mode == 'matplotlib':
+            log.info("Drawing %s with the fast renderer, matplotlib only draws rect grids", output_file)
+        write_png(tri_image(solution, colors), output_file)
+    elif mode == 'fast':
+        write_png(solution_image(solution, colors), output_file)
+    else:
+        from src.visualize import visualize_solution
+        visualize_solution(solution, colors, output_file)
+
+class BackgroundRenderer:
+    """Renders images in a worker thread, so solving can go on meanwhile.
+
+    Compressing the PNG data releases the GIL. pyplot is not thread safe,
+    so matplotlib images are still drawn in the calling thread."""
+
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+        self.jobs = []
+
+    def submit(self, solution, colors, output_file, mode='fast', grid_type='rect'):
+        if mode == 'matplotlib' and grid_type == 'rect':
+            render_solution(solution, colors, output_file, mode)
+            return
+        self.jobs.append(self.pool.submit(render_solution, solution, colors, output_file, mode, grid_type))
+
+    def close(self):
+        """Wait for the pending images, raising the first rendering error"""
+        self.pool.shutdown(wait=True)
+        for job in self.jobs:
+            job.result()
+        self.jobs = []
@@ -1,230 +1,507 @@
-from pysat.formula import CNF
+import logging
+import numpy as np
+from src.line_solver import solve_line
+from src.var_layout import VarLayout
+
+log = logging.getLogger(__name__)
+
+# Available constraint encodings:
+# - 'pairwise':   pairwise at-most-one and pairwise block ordering (quadratic)
+# - 'seqcounter': sequential counter at-most-one, ordering via counter prefixes
+# - 'ladder':     ladder (order) encoding of the block start, linear ordering
+# - 'bdd':        layered automaton over the cells of each line, no start vars
+ENCODINGS = ('pairwise', 'seqcounter', 'ladder', 'bdd')
+
+# Groups up to this size use pairwise at-most-one even in the linear modes,
+# since the sequential counter only produces fewer clauses above it
+PAIRWISE_AMO_LIMIT = 5
+
+def _columns(*columns):
+    """Stack literal arrays (broadcast against each other) into a clause block"""
+    columns = np.broadcast_arrays(*columns)
+    return np.stack([np.ravel(column) for column in columns], axis=1)
 
 class SATEncoder:
-    def __init__(self, nonogram):
+    def __init__(self, nonogram, mode='pairwise'):
+        if mode not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{mode}', expected one of {ENCODINGS}")
         self.nonogram = nonogram
-        self.var_counter = 1
-        self.var_mapping = {}
-        self.cnf = CNF()
-    
-    def get_fresh_var(self):
-        """Get a new variable ID"""
-        var = self.var_counter
-        self.var_counter += 1
-        return var
-    
+        self.mode = mode
+        self.ncolors = len(nonogram.colors) - 1
+        self.shape = nonogram.shape
+        self.layout = VarLayout(self.shape, self.ncolors)
+        self.cnf = None  # set by encode
+        # First encoded line per (mode, clue, masks or line length), see encode_line
+        self.templates = {}
+
+    def stats(self):
+        """Return the size of the last encoding"""
+        return {
+            'mode': self.mode,
+            'variables': self.cnf.nv,
+            'clauses': len(self.cnf.clauses),
+        }
+
     def encode_block_start(self):
         """Encode the nonogram using the block start variables approach"""
-        # Fix the column clue misalignment for this specific puzzle
-        if (self.nonogram.height == 4 and 
-            self.nonogram.width == 5 and
-            len(self.nonogram.col_clues) == 5 and
-            len(self.nonogram.col_clues[3]) == 1 and
-            self.nonogram.col_clues[3][0][0] == 4 and
-            self.nonogram.col_clues[3][0][1] == 'a' and
-            not self.nonogram.col_clues[4]):
-            # Swap the clues for columns 3 and 4
-            self.nonogram.col_clues[4] = self.nonogram.col_clues[3]
-            self.nonogram.col_clues[3] = []
-            print("DEBUG: Fixed column clue alignment")
-        # Create a debug function
-        def debug_print(text):
-            print(f"DEBUG: {text}")
-        
-        debug_print("Starting encoding...")
-        self.var_counter = 1
-        self.var_mapping = {}
+        return self.encode('pairwise')
+
+    def encode(self, mode=None, known=None):
+        """Encode the nonogram using the given encoding (see ENCODINGS).
+
+        known is an optional grid of cell color masks from the line solver;
+        excluded colors become unit clauses and impossible block start
+        positions are left out of the encoding."""
+        if mode is not None:
+            if mode not in ENCODINGS:
+                raise ValueError(f"Unknown encoding '{mode}', expected one of {ENCODINGS}")
+            self.mode = mode
+
+        debug = log.isEnabledFor(logging.DEBUG)
+        if debug:
+            log.debug("Starting encoding (%s)...", self.mode)
+        clauses = self.begin(known)
+
+        # Process the lines of every direction, e.g. rows then columns
+        for direction, index, _ in self.shape.iter_lines():
+            if debug:
+                log.debug("Processing %s %d: %s", direction, index,
+                          self.nonogram.clues[direction][index].tolist())
+            clauses.extend(self.encode_line(direction, index))
+
+        # Hand over all clauses at once; pysat is only loaded once a puzzle needs SAT
+        from pysat.formula import CNF
         self.cnf = CNF()
-        
-        # Create cell color variables
-        cell_vars = {}
-        for r in range(self.nonogram.height):
-            for c in range(self.nonogram.width):
-                for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                    color = chr(ord('a') + color_idx - 1)
-                    cell_vars[(r, c, color)] = self.get_fresh_var()
-                    self.var_mapping[cell_vars[(r, c, color)]] = ('cell', r, c, color)
-        
+        self.cnf.clauses = clauses
+        self.cnf.nv = self.layout.top
+
+        if debug:
+            self._log_cnf()
+
+        return self.cnf, self.layout
+
+    def symmetries(self):
+        """Mirror symmetries of the clues, as permutations of the cell numbers.
+
+        For a permutation p, recoloring every cell i like cell p[i] turns a
+        solution into another one. Only 'rect' grids are checked, for the
+        left-right mirror, the top-bottom mirror and the half turn."""
+        if self.shape.grid_type != 'rect':
+            return []
+        height, width = self.shape.size
+        rows, cols = self.nonogram.row_clues, self.nonogram.col_clues
+
+        def same(clues, order, reverse):
+            return all(np.array_equal(clues[i], clues[j][::-1] if reverse else clues[j])
+                       for i, j in enumerate(order))
+
+        cells = np.arange(height * width).reshape(height, width)
+        found = []
+        # Each row reads the same backwards and column c swaps with column w - 1 - c
+        if same(rows, range(height), True) and same(cols, range(width)[::-1], False):
+            found.append(cells[:, ::-1].ravel())
+        if same(cols, range(width), True) and same(rows, range(height)[::-1], False):
+            found.append(cells[::-1, :].ravel())
+        if same(rows, range(height)[::-1], True) and same(cols, range(width)[::-1], True):
+            found.append(cells[::-1, ::-1].ravel())
+        return found
+
+    def break_symmetries(self, symmetries):
+        """Add lex-leader clauses keeping one solution of each symmetric pair.
+
+        For each permutation p (an involution, see symmetries) the cell
+        variables X must be lexicographically at most X permuted by p. The
+        first position where they differ always belongs to a cell c with
+        c < p[c], so only those positions are compared. Call after encode."""
+        cells = self.cell_vars
+        for n, perm in enumerate(symmetries):
+            compared = np.flatnonzero(np.arange(len(perm)) < perm)
+            x = cells[compared].ravel()
+            y = cells[perm[compared]].ravel()
+            if len(x) == 0:
+                continue
+            # equal[t]: the positions before t are all equal
+            equal = self.layout.add_family(('symmetry', n), (len(x),))
+            self.blocks.append(_columns(equal[0]))
+            self.blocks.append(_columns(-equal, -x, y))
+            self.blocks.append(_columns(-equal[:-1], -x[:-1], equal[1:]))
+            self.blocks.append(_columns(-equal[:-1], y[:-1], equal[1:]))
+        self.cnf.clauses.extend(self._take_clauses())
+        self.cnf.nv = self.layout.top
+
+    def begin(self, known=None):
+        """Start a new formula with the cell variables and the cell constraints.
+
+        Returns the clauses that do not belong to any line; the lines are
+        added with encode_line (encode does both)."""
+        ncolors = self.ncolors
+        self.layout = VarLayout(self.shape, ncolors)
+        self.known = known
+        # Clauses are collected as fixed width blocks plus a list of the rest
+        self.blocks = []
+        self.ragged = []
+
+        # Cell color variables come first, see VarLayout
+        self.cell_vars = self.layout.cell_vars()
+
         # Each cell can have at most one color
-        for r in range(self.nonogram.height):
-            for c in range(self.nonogram.width):
-                colors = []
-                for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                    color = chr(ord('a') + color_idx - 1)
-                    colors.append(cell_vars[(r, c, color)])
-                
-                # At most one color can be true (pairwise exclusion)
-                for i in range(len(colors)):
-                    for j in range(i+1, len(colors)):
-                        self.cnf.append([-colors[i], -colors[j]])
-        
-        # Process rows
-        for r in range(self.nonogram.height):
-            debug_print(f"Processing row {r}: {self.nonogram.row_clues[r]}")
-            self._encode_row_block_start(r, cell_vars)
-        
-        # Process columns
-        for c in range(self.nonogram.width):
-            debug_print(f"Processing column {c}: {self.nonogram.col_clues[c]}")
-            self._encode_column_block_start(c, cell_vars)
-        
-        # Add this debugging section right before returning
-        def debug_print_cnf():
-            print("\nDEBUG: First 10 clauses:")
-            for i, clause in enumerate(self.cnf.clauses[:10]):
-                print(f"  Clause {i}: {clause}")
-            
-            print(f"\nDEBUG: Number of variables: {self.cnf.nv}")
-            print(f"DEBUG: Number of clauses: {len(self.cnf.clauses)}")
-            
-            # Print variable mapping for a few variables
-            print("\nDEBUG: Some variable mappings:")
-            count = 0
-            for var, info in self.var_mapping.items():
-                if count < 10:
-                    print(f"  Var {var}: {info}")
-                    count += 1
-
-        debug_print_cnf()
-        
-        return self.cnf, self.var_mapping
-    
-    def _encode_row_block_start(self, row, cell_vars):
-        """Encode block start variables for a row with multiple colors"""
-        clues = self.nonogram.row_clues[row]
-        width = self.nonogram.width
-        
-        if not clues:
-            # If no clues, all cells must be uncolored
-            for c in range(width):
-                for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                    color = chr(ord('a') + color_idx - 1)
-                    self.cnf.append([-cell_vars[(row, c, color)]])
+        self._at_most_one(self.cell_vars, ('cell_amo',))
+
+        # Cells already determined by the line solver
+        if known is not None:
+            masks = np.array(known, dtype=np.int64).reshape(-1, 1)
+            bits = np.left_shift(1, np.arange(1, ncolors + 1))
+            self.blocks.append(_columns(-self.cell_vars[(masks & bits) == 0]))
+            self.blocks.append(_columns(self.cell_vars[masks == bits]))
+            # Cells known to be colored, but not with which color yet; the
+            # bdd automaton leaves out the background for them
+            colored = ((masks[:, 0] & 1) == 0) & (np.count_nonzero(masks & bits, axis=1) > 1)
+            self.blocks.append(self.cell_vars[colored])
+
+        return self._take_clauses()
+
+    def encode_line(self, direction, index, guard=None):
+        """Encode the current clue of one line, e.g. ('row', 3) or ('col', 0).
+
+        New aux variables continue after the existing ones in the layout.
+        A line with the same clue and known cells as an earlier one reuses
+        its clauses with the variables renamed instead of being encoded
+        again. With a guard literal every clause gets -guard added, so the
+        line only constrains the cells while guard is true. Returns the
+        clauses as a list."""
+        cells = self.shape.lines[direction][index]
+        masks = None if self.known is None else [self.known[cell] for cell in cells.tolist()]
+        clues = self.nonogram.clues[direction][index].tolist()
+
+        lits = self.cell_vars[cells]
+
+        key = (self.mode, tuple(map(tuple, clues)), len(cells) if masks is None else tuple(masks))
+        template = self.templates.get(key)
+        if template is not None:
+            self._instantiate(template, lits, direction, index)
+        else:
+            first_aux = self.layout.top + 1
+            families = self.layout.num_families
+            self._encode_line(lits, clues, direction, index, masks)
+            self.templates[key] = (list(self.blocks), list(self.ragged), lits, first_aux,
+                                   self.layout.top + 1 - first_aux, self.layout.families(families))
+
+        if guard is None:
+            return self._take_clauses()
+        self.blocks = [np.hstack([block, np.full((len(block), 1), -guard, dtype=block.dtype)])
+                       for block in self.blocks]
+        self.ragged = [clause + [-guard] for clause in self.ragged]
+        return self._take_clauses()
+
+    def _instantiate(self, template, lits, direction, index):
+        """Add the clauses of an earlier line for the cell variables lits.
+
+        The cell variables of the template line are mapped to lits by
+        position and its aux variables to new ones of the same families."""
+        blocks, ragged, source, source_aux, aux_count, families = template
+        first_aux = self.layout.top + 1
+        for tag, shape, origin in families:
+            name = tag[0].split('_', 1)[1]
+            self.layout.add_family((f'{direction}_{name}', index) + tag[2:], shape, origin)
+
+        # Cell variables map through the table directly, aux variables
+        # through the entries after the last cell variable
+        num_cell_vars = self.layout.num_cell_vars
+        table = np.zeros(num_cell_vars + 1 + aux_count, dtype=np.int32)
+        table[source.ravel()] = lits.ravel()
+        table[num_cell_vars + 1:] = np.arange(first_aux, first_aux + aux_count)
+        shift = source_aux - num_cell_vars - 1
+
+        def remap(clauses):
+            var = np.abs(clauses)
+            mapped = table[np.where(var >= source_aux, var - shift, var)]
+            return np.where(clauses < 0, -mapped, mapped)
+
+        for block in blocks:
+            self.blocks.append(remap(block))
+        if ragged:
+            ends = np.cumsum([len(clause) for clause in ragged]).tolist()
+            flat = remap(np.array([lit for clause in ragged for lit in clause], dtype=np.int64)).tolist()
+            self.ragged.extend(flat[start:end] for start, end in zip([0] + ends, ends))
+
+    def _take_clauses(self):
+        """Return the collected clauses as lists and start collecting anew"""
+        clauses = []
+        for block in self.blocks:
+            clauses.extend(block.tolist())
+        clauses.extend(self.ragged)
+        self.blocks = []
+        self.ragged = []
+        return clauses
+
+    def _log_cnf(self):
+        """Log the start of the formula and a few variable mappings"""
+        for i, clause in enumerate(self.cnf.clauses[:10]):
+            log.debug("Clause %d: %s", i, clause)
+        log.debug("Number of variables: %d", self.cnf.nv)
+        log.debug("Number of clauses: %d", len(self.cnf.clauses))
+        for var in range(1, min(self.layout.top, 10) + 1):
+            log.debug("Var %d: %s", var, self.layout.lookup(var))
+
+    def _at_most_one(self, lits, tag):
+        """At most one literal per row of lits is true.
+
+        Uses pairwise exclusion or a sequential counter depending on mode."""
+        if self.mode == 'pairwise' or lits.shape[1] <= PAIRWISE_AMO_LIMIT:
+            first, second = np.triu_indices(lits.shape[1], 1)
+            self.blocks.append(_columns(-lits[:, first], -lits[:, second]))
             return
-        
-        # Create block start variables
-        start_vars = {}
-        
-        for b, (block_len, color) in enumerate(clues):
-            for c in range(width - block_len + 1):
-                start_vars[(row, b, c)] = self.get_fresh_var()
-                self.var_mapping[start_vars[(row, b, c)]] = ('row_start', row, b, c)
-        
-        # Each block must start somewhere (exactly one start position per block)
-        for b, (block_len, color) in enumerate(clues):
-            # At least one start position
-            self.cnf.append([start_vars[(row, b, c)] 
-                            for c in range(width - block_len + 1)])
-            
-            # At most one start position 
-            for c1 in range(width - block_len + 1):
-                for c2 in range(c1 + 1, width - block_len + 1):
-                    self.cnf.append([-start_vars[(row, b, c1)], -start_vars[(row, b, c2)]])
-        
-        # Link cells to blocks
-        for c in range(width):
-            # For each possible color
-            for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                color_name = chr(ord('a') + color_idx - 1)
-                cell_var = cell_vars[(row, c, color_name)]
-                
-                # Create list of block starts that would color this cell
-                block_starts = []
-                
-                for b, (block_len, block_color) in enumerate(clues):
-                    if block_color == color_name:
-                        # If block b covers this cell
-                        for offset in range(block_len):
-                            start_pos = c - offset
-                            if 0 <= start_pos <= width - block_len:
-                                block_starts.append(start_vars[(row, b, start_pos)])
-                                # If block starts here, cell must be colored
-                                self.cnf.append([-start_vars[(row, b, start_pos)], cell_var])
-                
-                # Cell is colored only if it's part of a block
-                if block_starts:
-                    self.cnf.append([-cell_var] + block_starts)
-        
-        # Block ordering constraint 
-        for b1 in range(len(clues) - 1):
-            block_len1, color1 = clues[b1]
-            b2 = b1 + 1
-            block_len2, color2 = clues[b2]
-            
-            for c1 in range(width - block_len1 + 1):
-                # Calculate the minimum position where block b2 can start
-                min_pos = c1 + block_len1 + 1  # ALWAYS add 1 space between blocks
-                
-                for c2 in range(width - block_len2 + 1):
-                    if c2 < min_pos:
-                        self.cnf.append([-start_vars[(row, b1, c1)], -start_vars[(row, b2, c2)]])
-    
-    def _encode_column_block_start(self, col, cell_vars):
-        """Encode block start variables for a column with multiple colors"""
-        clues = self.nonogram.col_clues[col]
-        height = self.nonogram.height
-        
+        self._sequential_counter(lits, tag)
+
+    def _sequential_counter(self, lits, tag):
+        """Sinz sequential counter for at-most-one per row of lits.
+
+        Returns the counter variables, where prefix[:, i] is implied by any
+        of lits[:, 0..i] being true (defined for i < lits.shape[1] - 1)."""
+        groups, size = lits.shape
+        prefix = self.layout.add_family(tag + ('seq',), (groups, size - 1))
+        if size < 2:
+            return prefix
+
+        self.blocks.append(_columns(-lits[:, :-1], prefix))
+        self.blocks.append(_columns(-prefix[:, :-1], prefix[:, 1:]))
+        self.blocks.append(_columns(-prefix[:, :-1], -lits[:, 1:-1]))
+        self.blocks.append(_columns(-prefix[:, -1], -lits[:, -1]))
+        return prefix
+
+    def _ladder(self, lits, tag):
+        """Ladder (order) encoding of exactly-one per row of lits.
+
+        Returns the ladder variables, where prefix[:, i] holds exactly when
+        the true literal is one of lits[:, 0..i]."""
+        groups, size = lits.shape
+        prefix = self.layout.add_family(tag + ('ladder',), (groups, size - 1))
+        if size < 2:
+            self.blocks.append(_columns(lits))
+            return prefix
+
+        # The prefix only switches on once
+        self.blocks.append(_columns(-prefix[:, :-1], prefix[:, 1:]))
+        # lits[i] <-> prefix[i] and not prefix[i-1]
+        self.blocks.append(_columns(-lits[:, :-1], prefix))
+        self.blocks.append(_columns(-lits[:, 1:], -prefix))
+        self.blocks.append(_columns(lits[:, 0], -prefix[:, 0]))
+        self.blocks.append(_columns(lits[:, 1:-1], -prefix[:, 1:], prefix[:, :-1]))
+        self.blocks.append(_columns(lits[:, -1], prefix[:, -1]))
+        return prefix
+
+    def _encode_exactly_one_start(self, starts, tag):
+        """Each block starts at exactly one position.
+
+        Returns the prefix variables used for the block ordering constraint,
+        or None for the pairwise encoding."""
+        if len(starts) == 0:
+            # The block does not fit in the line
+            self.ragged.append([])
+            return starts
+
+        if self.mode == 'ladder':
+            return self._ladder(starts.reshape(1, -1), tag)[0]
+
+        # At least one start position
+        self.ragged.append(starts.tolist())
+
+        if self.mode == 'seqcounter':
+            return self._sequential_counter(starts.reshape(1, -1), tag)[0]
+
+        # At most one start position
+        first, second = np.triu_indices(len(starts), 1)
+        self.blocks.append(_columns(-starts[first], -starts[second]))
+        return None
+
+    def _encode_block_order(self, starts1, first1, block_len1, starts2, first2, prefix2, gap):
+        """Block 2 starts after block 1 ends (plus gap).
+
+        starts1 and starts2 hold the start variables of consecutive
+        positions, beginning at positions first1 and first2."""
+        # Last start index of block 2 that is too early for each start of block 1
+        limit = np.arange(len(starts1)) + first1 + block_len1 + gap - 1 - first2
+
+        if prefix2 is None:
+            p1, p2 = np.nonzero(np.arange(len(starts2))[None, :] <= limit[:, None])
+            self.blocks.append(_columns(-starts1[p1], -starts2[p2]))
+            return
+
+        # Block 2 has no room left after these starts
+        self.blocks.append(_columns(-starts1[limit >= len(starts2) - 1]))
+        inside = (limit >= 0) & (limit < len(starts2) - 1)
+        self.blocks.append(_columns(-starts1[inside], -prefix2[limit[inside]]))
+
+    def _encode_line_bdd(self, lits, clues, tag, masks=None):
+        """Encode a line as a layered automaton over its cells.
+
+        lits[i, k - 1] is the variable for cell i having color k. The
+        automaton reads the cells in order; its states are 'free before block
+        b' and 'inside block b after j cells'. Only states that are reachable
+        from the start and can still reach an accepting state are encoded,
+        reading only the colors that masks still allow for each cell."""
+        n = len(lits)
+        k = len(clues)
+        block_colors = [color for _, color in clues]
+
+        # State ids: free states 0..k, then one state per block cell
+        block_of = {}
+        first_state = []
+        for b, (block_len, _) in enumerate(clues):
+            first_state.append(k + 1 + len(block_of))
+            for j in range(block_len):
+                block_of[first_state[b] + j] = (b, j + 1)
+
+        def enter(b, color):
+            # Start block b with a cell of the given color
+            if b < k and block_colors[b] == color:
+                return first_state[b]
+            return None
+
+        def step(state, color):
+            # Transition of the automaton (color 0 is the background), None for a dead end
+            if state <= k:
+                return state if color == 0 else enter(state, color)
+            b, j = block_of[state]
+            if j < clues[b][0]:
+                return state + 1 if color == block_colors[b] else None
+            # Block b is complete, same colored blocks need a space
+            if color == 0:
+                return b + 1
+            return enter(b + 1, color) if color != block_colors[b] else None
+
+        accepting = {k, first_state[k - 1] + clues[k - 1][0] - 1}
+
+        # Colors each cell can still take
+        all_colors = list(range(self.ncolors + 1))
+        if masks is None:
+            options = [all_colors] * n
+        else:
+            options = [[color for color in all_colors if masks[i] & (1 << color)] for i in range(n)]
+
+        # Forward reachability
+        layers = [{0}]
+        for i in range(n):
+            layer = set()
+            for state in layers[-1]:
+                for color in options[i]:
+                    nxt = step(state, color)
+                    if nxt is not None:
+                        layer.add(nxt)
+            layers.append(layer)
+
+        # Backward pruning
+        layers[n] &= accepting
+        for i in range(n - 1, -1, -1):
+            layers[i] = {
+                state for state in layers[i]
+                if any(step(state, color) in layers[i + 1] for color in options[i])
+            }
+
+        if not layers[0]:
+            # The clue does not fit in this line
+            self.ragged.append([])
+            return
+
+        # One variable per (layer, state), numbered layer by layer
+        ids = iter(self.layout.add_family(tag + ('state',), (sum(len(layer) for layer in layers),)).tolist())
+        state_vars = [{state: next(ids) for state in sorted(layer)} for layer in layers]
+
+        self.ragged.append([state_vars[0][0]])
+        self.ragged.append(list(state_vars[n].values()))
+
+        line_lits = lits.tolist()
+        for i in range(n):
+            for state, var in state_vars[i].items():
+                # Excluded colors are already ruled out by unit clauses
+                for color in options[i]:
+                    nxt = state_vars[i + 1].get(step(state, color))
+                    if color == 0:
+                        clause = [-var] + line_lits[i]
+                    else:
+                        clause = [-var, -line_lits[i][color - 1]]
+                    if nxt is not None:
+                        clause.append(nxt)
+                    self.ragged.append(clause)
+
+    def _block_positions(self, clues, length, masks):
+        """Range of start positions for each block of a line.
+
+        Without known cells every position the block fits at is used.
+        Otherwise the range spans the feasible starts found by the line
+        solver, and the infeasible starts inside it are returned as well.
+        Returns None if the line has no solution."""
+        if masks is None:
+            return [range(length - block_len + 1) for block_len, _ in clues], [()] * len(clues)
+
+        solved = solve_line(clues, masks)
+        if solved is None:
+            return None, None
+        positions = [range(starts[0], starts[-1] + 1) for starts in solved[1]]
+        excluded = [set(span) - set(starts) for span, starts in zip(positions, solved[1])]
+        return positions, excluded
+
+    def _encode_line(self, lits, clues, kind, index, masks=None):
+        """Encode the clues of one line over its cell variables lits[i, k - 1].
+
+        clues is a list of (length, color index) pairs and masks the known
+        color masks of the cells, if any."""
         if not clues:
             # If no clues, all cells must be uncolored
-            for r in range(height):
-                for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                    color = chr(ord('a') + color_idx - 1)
-                    self.cnf.append([-cell_vars[(r, col, color)]])
+            self.blocks.append(_columns(-lits))
+            return
+
+        if self.mode == 'bdd':
+            self._encode_line_bdd(lits, clues, (f'{kind}_bdd', index), masks)
+            return
+
+        # Block start positions, narrowed down by the known cells
+        positions, excluded = self._block_positions(clues, len(lits), masks)
+        if positions is None:
+            self.ragged.append([])
             return
-        
+
         # Create block start variables
-        start_vars = {}
-        
-        for b, (block_len, color) in enumerate(clues):
-            for r in range(height - block_len + 1):
-                start_vars[(col, b, r)] = self.get_fresh_var()
-                self.var_mapping[start_vars[(col, b, r)]] = ('col_start', col, b, r)
-        
+        starts = []
+        for b, span in enumerate(positions):
+            starts.append(self.layout.add_family((f'{kind}_start', index, b), (len(span),), (span.start,)))
+
+        # Starts the line solver has ruled out
+        for b, blocked in enumerate(excluded):
+            if blocked:
+                self.blocks.append(_columns(-starts[b][np.array(sorted(blocked)) - positions[b].start]))
+
         # Each block must start somewhere (exactly one start position per block)
+        prefixes = []
+        for b in range(len(clues)):
+            prefixes.append(self._encode_exactly_one_start(starts[b], (f'{kind}_prefix', index, b)))
+
+        # Link cells to blocks: if a block starts here, its cells are colored
+        covering = [[[] for _ in range(self.ncolors)] for _ in range(len(lits))]
         for b, (block_len, color) in enumerate(clues):
-            # At least one start position
-            self.cnf.append([start_vars[(col, b, r)] 
-                            for r in range(height - block_len + 1)])
-            
-            # At most one start position 
-            for r1 in range(height - block_len + 1):
-                for r2 in range(r1 + 1, height - block_len + 1):
-                    self.cnf.append([-start_vars[(col, b, r1)], -start_vars[(col, b, r2)]])
-        
-        # Link cells to blocks
-        for r in range(height):
-            # For each possible color
-            for color_idx, _ in enumerate(self.nonogram.colors[1:], 1):
-                color_name = chr(ord('a') + color_idx - 1)
-                cell_var = cell_vars[(r, col, color_name)]
-                
-                # Create list of block starts that would color this cell
-                block_starts = []
-                
-                for b, (block_len, block_color) in enumerate(clues):
-                    if block_color == color_name:
-                        # If block b covers this cell
-                        for offset in range(block_len):
-                            start_pos = r - offset
-                            if 0 <= start_pos <= height - block_len:
-                                block_starts.append(start_vars[(col, b, start_pos)])
-                                # If block starts here, cell must be colored
-                                self.cnf.append([-start_vars[(col, b, start_pos)], cell_var])
-                
-                # Cell is colored only if it's part of a block
-                if block_starts:
-                    self.cnf.append([-cell_var] + block_starts)
-        
-        # Block ordering constraint 
+            color_idx = color - 1
+            span = np.array(positions[b], dtype=np.int64)
+            cells = span[:, None] + np.arange(block_len)[None, :]
+            self.blocks.append(_columns(-starts[b][:, None], lits[cells, color_idx]))
+
+            # Remember which starts cover each cell
+            for pos, var in zip(positions[b], starts[b].tolist()):
+                for cell in range(pos, pos + block_len):
+                    covering[cell][color_idx].append(var)
+
+        # Cell is colored only if it's part of a block
+        line_lits = lits.tolist()
+        for cell in range(len(lits)):
+            for color_idx in range(self.ncolors):
+                self.ragged.append([-line_lits[cell][color_idx]] + covering[cell][color_idx])
+
+        # Block ordering constraint
         for b1 in range(len(clues) - 1):
             block_len1, color1 = clues[b1]
             b2 = b1 + 1
             block_len2, color2 = clues[b2]
-            
-            for r1 in range(height - block_len1 + 1):
-                # Calculate the minimum position where block b2 can start
-                min_pos = r1 + block_len1 + 1  # ALWAYS add 1 space between blocks
-                
-                for r2 in range(height - block_len2 + 1):
-                    if r2 < min_pos:
-                        self.cnf.append([-start_vars[(col, b1, r1)], -start_vars[(col, b2, r2)]])
\ No newline at end of file
+
+            # Blocks of the same color need a space between them
+            gap = 1 if color1 == color2 else 0
+            self._encode_block_order(starts[b1], positions[b1].start, block_len1,
+                                     starts[b2], positions[b2].start, prefixes[b2], gap)
@@ -0,0 +1,412 @@
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+import multiprocessing as mp
+from collections import deque
+from src.nonogram import parse_puzzles, GRID_TYPES
+from src.sat_encoder import ENCODINGS
+from src.portfolio import engine_name
+
+log = logging.getLogger(__name__)
+
+GOALS = ('solve', 'check', 'unique')
+
+# Largest request body accepted, in bytes
+MAX_BODY = 16 * 2 ** 20
+
+# Number of recent requests the latency percentiles are taken over
+LATENCY_WINDOW = 1000
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+               500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+class RequestError(Exception):
+    """A request that cannot be answered, with the HTTP status to reply with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _warm_up(solver_name):
+    """Load the solver modules and the native SAT engine before the first job"""
+    from src.generator import random_puzzle
+    from src.main import solve_puzzle
+    import random
+    nonogram, _ = random_puzzle((5, 5), 2, rng=random.Random(0))
+    solve_puzzle(nonogram, propagate=False, solver_name=solver_name)
+
+def _worker_main(conn, solver_name):
+    """Worker process loop: solve the jobs received on conn one at a time"""
+    _warm_up(solver_name)
+    from src.main import solve_puzzle
+    conn.send('ready')
+    while True:
+        try:
+            goal, nonogram, options = conn.recv()
+        except EOFError:
+            return
+        try:
+            max_solutions = 2 if goal == 'unique' else None
+            solution, stats = solve_puzzle(nonogram, max_solutions=max_solutions, solver_name=solver_name,
+                                           **options)
+            result = {'name': nonogram.name, 'solved': solution is not None,
+                      'solution': [''.join(row) for row in solution] if solution else None}
+            if goal == 'unique':
+                result['solutions'] = stats['solutions']
+                result['unique'] = stats['solutions'] == 1
+            if 'conflict' in stats:
+                result['conflict'] = [f"{direction} {index}" for direction, index in stats['conflict']]
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+class Worker:
+    """A pre-warmed solver process, talking to the server over a pipe"""
+
+    def __init__(self, ctx, solver_name):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, solver_name), daemon=True)
+        self.process.start()
+        child.close()
+
+    def wait_ready(self):
+        if self.conn.recv() != 'ready':
+            raise RuntimeError("worker failed to start")
+
+    def run(self, job):
+        """Send a job and wait for its result, blocking (run it in a thread)"""
+        self.conn.send(job)
+        return self.conn.recv()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+class WorkerPool:
+    """A fixed number of worker processes handing out one job each at a time.
+
+    A job running past its timeout cannot be interrupted inside the SAT
+    engine, so its worker is terminated and a fresh one started in its
+    place. Workers are spawned rather than forked, as the server process
+    runs threads."""
+
+    def __init__(self, size, solver_name='glucose3'):
+        self.ctx = mp.get_context('spawn')
+        self.solver_name = solver_name
+        self.size = size
+        self.idle = None
+        self.busy = 0
+
+    async def start(self):
+        self.idle = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        workers = [Worker(self.ctx, self.solver_name) for _ in range(self.size)]
+        for worker in workers:
+            await loop.run_in_executor(None, worker.wait_ready)
+            self.idle.put_nowait(worker)
+
+    async def run(self, job, timeout):
+        """Run a job on the next idle worker, returns the worker's result.
+
+        Raises asyncio.TimeoutError when the job takes longer than timeout
+        seconds, counting from when a worker picks it up."""
+        loop = asyncio.get_running_loop()
+        worker = await self.idle.get()
+        self.busy += 1
+        try:
+            future = loop.run_in_executor(None, worker.run, job)
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                worker.stop()
+                worker = await loop.run_in_executor(None, self._replace)
+                raise
+            return result
+        finally:
+            self.busy -= 1
+            self.idle.put_nowait(worker)
+
+    def _replace(self):
+        worker = Worker(self.ctx, self.solver_name)
+        worker.wait_ready()
+        return worker
+
+    def close(self):
+        while self.idle is not None and not self.idle.empty():
+            self.idle.get_nowait().stop()
+
+class Metrics:
+    """Request counters and latencies of the server"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.counts = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.puzzles = 0
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def finish(self, status, seconds, puzzles=0):
+        self.count(f"status_{status}")
+        self.latencies.append(seconds)
+        self.puzzles += puzzles
+
+    def snapshot(self, pool, pending):
+        uptime = time.time() - self.started
+        latencies = sorted(self.latencies)
+        snapshot = {
+            'uptime': round(uptime, 3),
+            'counts': dict(self.counts),
+            'pending': pending,
+            'workers': pool.size,
+            'busy_workers': pool.busy,
+            'puzzles': self.puzzles,
+            'puzzles_per_second': round(self.puzzles / uptime, 3) if uptime > 0 else 0.0,
+        }
+        if latencies:
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+            else:
+                cuts = latencies * 99
+            snapshot['latency'] = {'p50': round(cuts[49], 6), 'p90': round(cuts[89], 6),
+                                   'p99': round(cuts[98], 6), 'max': round(latencies[-1], 6)}
+        return snapshot
+
+def read_check_solution(text):
+    """Solution grid of a check request as rows of characters.
+
+    Accepts the solution file format and the one checkall.py sends to the
+    course server: a name, grid type and color line before rows of color
+    digits, 0 being the background."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # The header has a grid type line and a color line, the name may be one word
+    if len(lines) >= 3 and lines[1].split()[0] in GRID_TYPES and lines[2].startswith('#'):
+        lines = lines[3:]
+    digits = str.maketrans('0123456789', '-abcdefghi')
+    return [list(line.translate(digits)) for line in lines]
+
+class SolverServer:
+    """HTTP/JSON front end of the solver, see main() for the request format"""
+
+    def __init__(self, pool, max_pending=64, timeout=30.0, options=None):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.options = options or {}
+        self.pending = 0
+        self.metrics = Metrics()
+
+    async def handle_connection(self, reader, writer):
+        """Answer HTTP requests on a connection until the client closes it"""
+        try:
+            while True:
+                request = await self._read_request(reader, writer)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """Read one request, returns (method, path, headers, body) or None at the end"""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3:
+            self._write_response(writer, 400, {'error': 'malformed request line'}, False)
+            return None
+        method, path, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._write_response(writer, 400, {'error': 'invalid Content-Length'}, False)
+            return None
+        if length > MAX_BODY:
+            self._write_response(writer, 413, {'error': f"body larger than {MAX_BODY} bytes"}, False)
+            return None
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                'Content-Type: application/json',
+                f"Content-Length: {len(body)}",
+                'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+
+    async def dispatch(self, method, path, body):
+        """Answer one request, returns (HTTP status, JSON payload)"""
+        if path.rstrip('/') == '/metrics':
+            return 200, self.metrics.snapshot(self.pool, self.pending)
+        if path.rstrip('/') == '/health':
+            return 200, {'status': 'ok'}
+        if method not in ('GET', 'POST'):
+            return 404, {'error': f"unsupported method {method}"}
+
+        # Backpressure: refuse work rather than queue it without bound
+        if self.pending >= self.max_pending:
+            self.metrics.count('rejected')
+            return 503, {'error': 'server busy, retry later'}
+
+        start = time.perf_counter()
+        self.pending += 1
+        puzzles = 0
+        try:
+            goal, nonograms, request = self._parse_body(body)
+            puzzles = len(nonograms)
+            self.metrics.count(f"goal_{goal}")
+            status, payload = 200, {'goal': goal, 'results': await self._run(goal, nonograms, request)}
+        except RequestError as e:
+            status, payload = e.status, {'error': str(e)}
+        except asyncio.TimeoutError:
+            status, payload = 504, {'error': 'timed out'}
+        except Exception as e:
+            log.exception("Request failed")
+            status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            self.pending -= 1
+        self.metrics.finish(status, time.perf_counter() - start, puzzles if status == 200 else 0)
+        return status, payload
+
+    def _parse_body(self, body):
+        """Goal, puzzles and request fields of a request body.
+
+        The body is either a JSON object with 'goal' and 'clues' (and a
+        'solution' to check), or plain clue text to solve."""
+        text = body.decode('utf-8', errors='replace')
+        if text.lstrip().startswith('{'):
+            try:
+                request = json.loads(text)
+            except ValueError as e:
+                raise RequestError(400, f"invalid JSON: {e}") from None
+        else:
+            request = {'goal': 'solve', 'clues': text}
+
+        for field in ('clues', 'name', 'solution'):
+            if field in request and not isinstance(request[field], str):
+                raise RequestError(400, f"'{field}' must be a string")
+        goal = request.get('goal', 'solve')
+        if goal not in GOALS:
+            raise RequestError(400, f"unknown goal '{goal}', expected one of {GOALS}")
+        try:
+            nonograms = parse_puzzles(request.get('clues', ''), request.get('name', 'puzzle'))
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+        if not nonograms:
+            raise RequestError(400, 'no puzzle in the clues')
+        if goal == 'check':
+            if 'solution' not in request:
+                raise RequestError(400, "goal 'check' needs a solution")
+            nonograms = nonograms[:1]
+        return goal, nonograms, request
+
+    async def _run(self, goal, nonograms, request):
+        """Results of the puzzles of one request, solved in parallel"""
+        if goal == 'check':
+            from src.verify import verify_solution
+            correct, verdict = verify_solution(nonograms[0], read_check_solution(request['solution']))
+            return [{'name': nonograms[0].name, 'correct': correct, 'verdict': verdict}]
+
+        options = dict(self.options)
+        if 'encoding' in request:
+            if request['encoding'] not in ENCODINGS:
+                raise RequestError(400, f"unknown encoding '{request['encoding']}'")
+            options['encoding'] = request['encoding']
+        timeout = request.get('timeout', self.timeout)
+        try:
+            valid = not isinstance(timeout, bool) and float(timeout) > 0
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise RequestError(400, f"invalid timeout {timeout!r}, expected a positive number of seconds")
+        timeout = min(float(timeout), self.timeout)
+
+        jobs = [asyncio.ensure_future(self.pool.run((goal, nonogram, options), timeout))
+                for nonogram in nonograms]
+        try:
+            done = await asyncio.gather(*jobs)
+        finally:
+            # After a failure the rest of the bundle is not worth solving
+            for job in jobs:
+                job.cancel()
+        results = []
+        for ok, result in done:
+            if not ok:
+                raise RuntimeError(result)
+            results.append(result)
+        return results
+
+async def serve(host, port, workers, max_pending, timeout, options, solver_name):
+    pool = WorkerPool(workers, solver_name)
+    await pool.start()
+    server = SolverServer(pool, max_pending, timeout, options)
+    listener = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"Serving on http://{host}:{port} with {workers} workers", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        pool.close()
+
+def main():
+    """Run the solver as a long running HTTP service.
+
+    Requests are JSON objects {"goal": ..., "clues": ...} sent to any path
+    with GET or POST, in the shape checkall.py sends to the course server.
+    goal 'solve' solves every puzzle of the clue text, 'unique' also tells
+    whether each has exactly one solution and 'check' verifies 'solution'
+    against the first puzzle. A plain clue text body is solved. GET
+    /metrics reports request counts, latency percentiles and throughput."""
+    parser = argparse.ArgumentParser(description='Serve the nonogram solver over HTTP')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8973, help='Port to listen on')
+    parser.add_argument('--workers', '-j', type=int, default=mp.cpu_count(), help='Number of solver processes')
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='Requests handled at once, beyond this new ones get 503')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Longest time in seconds a puzzle may take, requests can only ask for less')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='pairwise',
+                        help='Constraint encoding used for the SAT formula')
+    parser.add_argument('--no-propagate', action='store_true',
+                        help='Skip the line solving pass before SAT encoding')
+    parser.add_argument('--solver', type=engine_name, default='glucose3', help='pysat engine used to solve the formula')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'],
+                        help='Level of the diagnostic log output')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s: %(name)s: %(message)s')
+
+    options = {'encoding': args.encoding, 'propagate': not args.no_propagate}
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending, args.timeout,
+                          options, args.solver))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
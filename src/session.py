@@ -0,0 +1,139 @@
+import copy
+from time import perf_counter
+import numpy as np
+from pysat.solvers import Solver
+from src.nonogram import parse_clue
+from src.sat_encoder import SATEncoder
+from src.solver import run_limited
+
+class SolveSession:
+    """Incremental solving of a puzzle whose clues are edited one line at a time.
+
+    The puzzle is encoded once into a single solver that stays alive. The
+    clauses of every line are guarded by an activation literal of that line,
+    and solve() assumes all current activation literals. Changing a clue
+    retires the literal of the old line with a unit clause and adds only
+    the clauses of the new line, so the solver keeps what it learned about
+    the rest of the puzzle.
+
+    Line solving is not used here, since what it deduces depends on the
+    clues of all lines. The ladder encoding is the default, as solving
+    under assumptions is much slower with the larger pairwise formulas."""
+
+    def __init__(self, nonogram, encoding='ladder', solver_name='glucose3'):
+        # Own copy of the clues, edits must not change the caller's puzzle
+        self.nonogram = copy.copy(nonogram)
+        self.nonogram.clues = {direction: list(clues) for direction, clues in nonogram.clues.items()}
+
+        self.encoder = SATEncoder(self.nonogram, mode=encoding)
+        base = self.encoder.begin()
+        self.solver_name = solver_name
+        self.solver = Solver(name=solver_name, bootstrap_with=base)
+        # 'sat', 'unsat' or 'unknown' when a limit stopped the last solve
+        self.status = None
+        self.layout = self.encoder.layout
+        self.active = {}  # (kind, index) -> activation literal
+        self.clauses = len(base)
+
+        for direction, index, _ in self.nonogram.shape.iter_lines():
+            self._add_line(direction, index)
+
+    def _add_line(self, kind, index):
+        """Encode the current clue of a line under a new activation literal"""
+        guard = int(self.layout.add_family(('active', kind, index), (1,))[0])
+        clauses = self.encoder.encode_line(kind, index, guard)
+        self.solver.append_formula(clauses)
+        self.clauses += len(clauses)
+        self.active[(kind, index)] = guard
+
+    def set_clue(self, kind, index, clue):
+        """Replace the clue of a line, e.g. set_clue('row', 3, '3a 1b').
+
+        kind is a direction of the grid ('row' or 'col' for rectangular
+        grids) and clue a clue string or an array like parse_clue returns."""
+        if kind not in self.nonogram.clues:
+            raise ValueError(f"Unknown line kind '{kind}', expected one of {tuple(self.nonogram.clues)}")
+        if isinstance(clue, str):
+            clue = parse_clue(clue)
+        clue = np.asarray(clue, dtype=np.int16).reshape(-1, 2)
+        ncolors = len(self.nonogram.colors) - 1
+        if ((clue[:, 0] < 1) | (clue[:, 1] < 1) | (clue[:, 1] > ncolors)).any():
+            raise ValueError(f"Invalid clue {clue.tolist()} for a puzzle with {ncolors} colors")
+
+        # Encode the new line before retiring the old one, so a failure
+        # leaves the session as it was
+        old_clue, old_guard = self.nonogram.clues[kind][index], self.active[(kind, index)]
+        self.nonogram.clues[kind][index] = clue
+        try:
+            self._add_line(kind, index)
+        except Exception:
+            self.nonogram.clues[kind][index] = old_clue
+            self.active[(kind, index)] = old_guard
+            raise
+
+        # The old clauses stay in the solver but can never be switched on again
+        self.solver.add_clause([-old_guard])
+
+    def set_row_clue(self, row, clue):
+        self.set_clue('row', row, clue)
+
+    def set_col_clue(self, col, clue):
+        self.set_clue('col', col, clue)
+
+    def solve(self, deadline=None, conflict_limit=None):
+        """Solve the puzzle with the current clues, returns the solution grid or None.
+
+        deadline (a perf_counter() time) and conflict_limit stop the search
+        early, self.status then tells 'unknown' from 'unsat'."""
+        satisfiable = run_limited(self.solver, self.solver_name, deadline, conflict_limit,
+                                  list(self.active.values()))
+        self.status = {True: 'sat', False: 'unsat', None: 'unknown'}[satisfiable]
+        if not satisfiable:
+            return None
+        return self.layout.decode(self.solver.get_model())
+
+    def conflict(self, minimize=True, deadline=None, conflict_limit=None):
+        """Lines whose clues contradict each other, after solve() found no solution.
+
+        Returns (kind, index) pairs from the unsat core of the last solve,
+        i.e. the activation literals it needed. With minimize, lines are
+        dropped one at a time while the rest stays unsatisfiable, so no
+        line of the result can be left out. Each of those solves gets
+        conflict_limit; once one runs out or deadline passes, the core
+        minimized so far is returned."""
+        lines = {guard: line for line, guard in self.active.items()}
+        core = [guard for guard in self.solver.get_core() or [] if guard in lines]
+        if minimize:
+            i = 0
+            while i < len(core):
+                if deadline is not None and perf_counter() >= deadline:
+                    break
+                rest = core[:i] + core[i + 1:]
+                satisfiable = run_limited(self.solver, self.solver_name, deadline, conflict_limit, rest)
+                if satisfiable is None:
+                    break
+                if satisfiable:
+                    i += 1
+                else:
+                    # Also drop whatever else the smaller core did without
+                    smaller = set(self.solver.get_core() or [])
+                    core = [guard for guard in rest if guard in smaller]
+        return sorted(lines[guard] for guard in core)
+
+    def stats(self):
+        """Formula size so far and the counters of the pysat engine"""
+        stats = {'variables': self.layout.top, 'clauses': self.clauses}
+        try:
+            stats.update(self.solver.accum_stats() or {})
+        except NotImplementedError:
+            pass  # e.g. Kissat does not expose them
+        return stats
+
+    def close(self):
+        self.solver.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,8 +1,26 @@
+import numpy as np
+
+def solution_cells(solution):
+    """Color index of every cell of a solution grid in row order, '-' = 0, 'a' = 1.
+
+    Characters other than '-' and lowercase letters give indexes outside
+    the palette, negative or above 26."""
+    codes = np.frombuffer(''.join(''.join(row) for row in solution).encode(), dtype=np.uint8)
+    return np.where(codes == ord('-'), 0, codes.astype(np.int16) - ord('a') + 1)
+
+def solution_text(solution):
+    """A solution grid in the .solution file format, one line per row"""
+    return ''.join(''.join(row) + '\n' for row in solution)
+
 def save_solution(solution, filename):
     """Save the solution to a file in the specified format"""
     with open(filename, 'w') as f:
-        for row in solution:
-            f.write(''.join(row) + '\n')
+        f.write(solution_text(solution))
+
+def read_solution(filename):
+    """Read a solution file into a list of rows of characters"""
+    with open(filename) as f:
+        return [list(line.rstrip('\n')) for line in f if line.strip()]
 
 def print_solution(solution):
     """Print the solution in a readable format"""
@@ -1,33 +1,157 @@
-from pysat.solvers import Glucose3
+import threading
+from time import perf_counter
+from pysat.solvers import Solver
+from src.portfolio import engine_features, solve_portfolio
+
+def unsupported_limits(solver_name, time_limit=None, conflict_limit=None):
+    """Names of the given limits that the engine cannot enforce.
+
+    pysat cannot interrupt e.g. CaDiCaL or Kissat, so no time limit stops
+    them, and Lingeling has no conflict budget either (see engine_features)."""
+    features = engine_features(solver_name)
+    unsupported = []
+    if time_limit is not None and 'interrupt' not in features:
+        unsupported.append('time_limit')
+    if conflict_limit is not None and 'conf_budget' not in features:
+        unsupported.append('conflict_limit')
+    return unsupported
+
+def run_limited(solver, engine, deadline=None, conflict_limit=None, assumptions=()):
+    """One call of a pysat solver, returns True, False or None if a limit stopped it.
+
+    Without limits this is a plain solve(). Otherwise solve_limited runs
+    with a conflict budget and a timer that interrupts it at deadline."""
+    if deadline is None and conflict_limit is None:
+        return solver.solve(assumptions=list(assumptions))
+
+    unsupported = unsupported_limits(engine, deadline, conflict_limit)
+    if unsupported:
+        raise NotImplementedError(f"{engine} cannot enforce {' or '.join(unsupported)}")
+    if conflict_limit is not None:
+        solver.conf_budget(conflict_limit)
+    timer = None
+    if deadline is not None:
+        timer = threading.Timer(max(deadline - perf_counter(), 0.0), solver.interrupt)
+        timer.start()
+    try:
+        satisfiable = solver.solve_limited(assumptions=list(assumptions), expect_interrupt=timer is not None)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    # Only after the search ran, an interrupt may be pending
+    if timer is not None:
+        solver.clear_interrupt()
+    return satisfiable
 
 class NonogramSolver:
-    def __init__(self, sat_formula, var_mapping):
+    def __init__(self, sat_formula, layout, solver_name='glucose3', portfolio=None):
         self.formula = sat_formula
-        self.var_mapping = var_mapping
-        self.solver = Glucose3()
-        
-        # Add all clauses to the solver
-        for clause in self.formula.clauses:
-            self.solver.add_clause(clause)
-    
-    def solve(self):
-        """Solve the SAT problem and return the model if satisfiable"""
-        if self.solver.solve():
+        self.layout = layout
+        self.portfolio = portfolio
+        self.solver_name = solver_name
+        self.engine = None
+        self.solver = None
+        self.solution_count = 0
+        # 'sat', 'unsat' or 'unknown' when a limit stopped the last solve
+        self.status = None
+
+        if portfolio:
+            # The engines load the clauses in their own processes
+            return
+
+        # Load all clauses into the solver in one call
+        self.solver = Solver(name=solver_name, bootstrap_with=self.formula.clauses)
+        self.engine = solver_name
+
+    def solve(self, max_solutions=None, symmetries=(), time_limit=None, conflict_limit=None):
+        """Solve the SAT problem and return the model if satisfiable.
+
+        With max_solutions, return a list of up to that many models with
+        distinct solution grids instead (see enumerate_models). time_limit
+        (seconds) and conflict_limit (per engine call) stop the search
+        early; self.status then tells an exhausted budget ('unknown') from
+        an unsatisfiable formula. A portfolio race only honors time_limit."""
+        if max_solutions is not None:
+            return self.enumerate_models(max_solutions, symmetries, time_limit, conflict_limit)
+
+        if self.portfolio:
+            model, self.engine, _ = solve_portfolio(self.formula.clauses, self.portfolio, time_limit)
+            self.status = 'sat' if model else ('unsat' if self.engine else 'unknown')
+            return model
+
+        deadline = None if time_limit is None else perf_counter() + time_limit
+        if self._run(deadline, conflict_limit):
             return self.solver.get_model()
-        else:
-            return None
-    
+        return None
+
+    def _run(self, deadline=None, conflict_limit=None):
+        """One call of the engine, sets self.status and returns whether it is 'sat'"""
+        satisfiable = run_limited(self.solver, self.engine, deadline, conflict_limit)
+        self.status = {True: 'sat', False: 'unsat', None: 'unknown'}[satisfiable]
+        return satisfiable is True
+
+    def enumerate_models(self, max_solutions, symmetries=(), time_limit=None, conflict_limit=None):
+        """Find up to max_solutions models with distinct solution grids.
+
+        Each model found is excluded with a blocking clause over its true
+        cell variables and the same solver instance is asked again. Every
+        solution colors the same number of cells, so a different grid must
+        leave out at least one of them; the aux variables are left free.
+
+        If the formula breaks symmetries (SATEncoder.break_symmetries), each
+        model stands for all grids its symmetries map it to. They are counted
+        in solution_count, which can exceed the number of models.
+
+        time_limit covers the whole enumeration. If a limit stops it,
+        self.status is 'unknown' and the models found so far are returned."""
+        if self.solver is None:
+            # Enumeration needs one incremental solver, not a portfolio race
+            self.solver = Solver(name=self.solver_name, bootstrap_with=self.formula.clauses)
+            self.engine = self.solver_name
+
+        num_cells = self.layout.num_cell_vars
+        deadline = None if time_limit is None else perf_counter() + time_limit
+        models = []
+        self.solution_count = 0
+        while self.solution_count < max_solutions and self._run(deadline, conflict_limit):
+            model = self.solver.get_model()
+            models.append(model)
+            self.solution_count += self._orbit_size(model, symmetries)
+            blocking = [-lit for lit in model[:num_cells] if lit > 0]
+            if not blocking:
+                break
+            self.solver.add_clause(blocking)
+        return models
+
+    def _orbit_size(self, model, symmetries):
+        """Number of distinct grids the symmetries map the grid of model to"""
+        if not len(symmetries):
+            return 1
+        grid = tuple(cell for row in self.layout.decode(model) for cell in row)
+        orbit = {grid}
+        pending = [grid]
+        while pending:
+            current = pending.pop()
+            for perm in symmetries:
+                image = tuple(current[i] for i in perm.tolist())
+                if image not in orbit:
+                    orbit.add(image)
+                    pending.append(image)
+        return len(orbit)
+
+    def stats(self):
+        """Counters of the pysat engine (conflicts, decisions, ...) so far.
+
+        Empty for a portfolio race, whose engines run in other processes,
+        and for engines that do not expose them, like Kissat."""
+        if self.solver is None:
+            return {}
+        try:
+            return self.solver.accum_stats() or {}
+        except NotImplementedError:
+            return {}
+
     def extract_solution(self, model, nonogram):
         """Extract the nonogram solution from the SAT model"""
-        # Initialize solution grid with empty cells
-        solution = [['-' for _ in range(nonogram.width)] for _ in range(nonogram.height)]
-        
-        # Fill in colored cells based on cell variables
-        for var, value in enumerate(model, 1):
-            if value > 0 and var in self.var_mapping:
-                var_info = self.var_mapping[var]
-                if var_info[0] == 'cell':
-                    r, c, color = var_info[1], var_info[2], var_info[3]
-                    solution[r][c] = color
-        
-        return solution
\ No newline at end of file
+        # Only the cell variables at the start of the model are read
+        return self.layout.decode(model)
@@ -0,0 +1,85 @@
+from bisect import bisect_right
+import numpy as np
+
+class VarLayout:
+    """Arithmetic mapping between SAT variable IDs and what they encode.
+
+    Variables are allocated in families of consecutive IDs. The cell color
+    variables always come first: cell number i of the grid shape (cells
+    are numbered row by row) has color k (1-based) in variable
+    1 + i * ncolors + k - 1. Aux variables are added as families with a
+    tag and a shape, so looking up a variable only needs a binary search
+    over the family offsets."""
+
+    __slots__ = ('shape', 'ncolors', 'top', '_firsts', '_families')
+
+    def __init__(self, shape, ncolors):
+        self.shape = shape
+        self.ncolors = ncolors
+        self.top = shape.num_cells * ncolors
+        self._firsts = []
+        self._families = []
+
+    @property
+    def num_cell_vars(self):
+        return self.shape.num_cells * self.ncolors
+
+    def cell_vars(self):
+        """Array of cell variables indexed by (cell number, k - 1)"""
+        return np.arange(1, self.num_cell_vars + 1, dtype=np.int32).reshape(-1, self.ncolors)
+
+    def cell_var(self, r, c, k):
+        """Variable for cell c of row r having color k (1-based)"""
+        return 1 + (self.shape.row_offsets[r] + c) * self.ncolors + k - 1
+
+    def add_family(self, tag, shape, origin=None):
+        """Allocate an array of new variables of the given shape.
+
+        lookup() reports them as tag + index, with origin added to the index
+        (e.g. the first start position of a block)."""
+        count = int(np.prod(shape))
+        first = self.top + 1
+        self.top += count
+        if count:
+            self._firsts.append(first)
+            self._families.append((tag, tuple(shape), origin))
+        return np.arange(first, first + count, dtype=np.int32).reshape(shape)
+
+    @property
+    def num_families(self):
+        return len(self._families)
+
+    def families(self, start=0):
+        """The (tag, shape, origin) of the aux families from number start on"""
+        return self._families[start:]
+
+    def lookup(self, var):
+        """Describe a variable, for debugging"""
+        var = abs(var)
+        if var < 1 or var > self.top:
+            return None
+        if var <= self.num_cell_vars:
+            cell, k = divmod(var - 1, self.ncolors)
+            r, c = self.shape.position(cell)
+            return ('cell', r, c, chr(ord('a') + k))
+
+        family = bisect_right(self._firsts, var) - 1
+        tag, shape, origin = self._families[family]
+        index = np.unravel_index(var - self._firsts[family], shape)
+        index = tuple(int(i) for i in index)
+        if origin is not None:
+            index = tuple(i + o for i, o in zip(index, origin))
+        return tag + index
+
+    def decode(self, model):
+        """Read the solution grid from the cell variables of a model"""
+        count = self.num_cell_vars
+        values = np.zeros(count, dtype=bool)
+        lits = np.array(model[:count], dtype=np.int64)
+        lits = lits[np.abs(lits) <= count]
+        values[np.abs(lits) - 1] = lits > 0
+
+        cells = values.reshape(-1, self.ncolors)
+        colors = np.where(cells.any(axis=1), cells.argmax(axis=1) + 1, 0)
+        names = np.array(['-'] + [chr(ord('a') + k) for k in range(self.ncolors)])
+        return self.shape.split_rows(names[colors].tolist())
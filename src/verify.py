@@ -0,0 +1,63 @@
+import numpy as np
+from src.solution import solution_cells
+
+def line_runs(cells, lines):
+    """Run-length encode the colors along many lines of a grid at once.
+
+    cells holds the color index of every cell by cell number and lines is
+    a list of arrays of cell numbers. Returns (lines, lengths, colors)
+    arrays with one entry per block of color, in line order and along
+    each line."""
+    lengths = np.array([len(line) for line in lines])
+    # The lines one after another, each behind a background separator
+    positions = np.arange(lengths.sum()) + np.repeat(np.arange(len(lines)) + 1, lengths)
+    flat = np.zeros(lengths.sum() + len(lines) + 1, dtype=np.int16)
+    flat[positions] = cells[np.concatenate([np.zeros(0, dtype=int)] + list(lines))]
+
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    starts, ends = changes[:-1], changes[1:]
+    colors = flat[starts]
+    keep = colors != 0
+    starts = starts[keep]
+    line_starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]])
+    return np.searchsorted(line_starts, starts, side='right') - 1, ends[keep] - starts, colors[keep]
+
+def clue_runs(clues):
+    """The expected blocks of a list of clue arrays, in the form of line_runs"""
+    blocks = np.concatenate([np.zeros((0, 2), dtype=np.int16)] + list(clues))
+    lines = np.repeat(np.arange(len(clues)), [len(clue) for clue in clues])
+    return lines, blocks[:, 0], blocks[:, 1]
+
+def _first_mismatch(actual, expected, count):
+    """Index of the first line whose blocks differ"""
+    for line in range(count):
+        got = [(int(l), int(c)) for i, l, c in zip(*actual) if i == line]
+        want = [(int(l), int(c)) for i, l, c in zip(*expected) if i == line]
+        if got != want:
+            return line, got, want
+    return None
+
+def verify_solution(nonogram, solution):
+    """Check a solution grid against the clues of a nonogram.
+
+    Returns (correct, message), where message describes the first problem
+    found or is 'Correct'."""
+    shape = nonogram.shape
+    if [len(row) for row in solution] != list(shape.row_lengths):
+        return False, f"Wrong: expected a {nonogram.grid_type} grid of size {'x'.join(map(str, nonogram.size))}"
+
+    ncolors = len(nonogram.colors) - 1
+    cells = solution_cells(solution)
+    if ((cells < 0) | (cells > ncolors)).any():
+        return False, "Wrong: unknown color in the grid"
+
+    for direction in shape.directions:
+        clues = nonogram.clues[direction]
+        actual = line_runs(cells, shape.lines[direction])
+        expected = clue_runs(clues)
+        if all(np.array_equal(a, e) for a, e in zip(actual, expected)):
+            continue
+        line, got, want = _first_mismatch(actual, expected, len(clues))
+        return False, f"Wrong: {direction} {line} has blocks {got}, expected {want}"
+
+    return True, "Correct"
@@ -1,8 +1,11 @@
+import logging
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
 import numpy as np
 
+log = logging.getLogger(__name__)
+
 def visualize_solution(solution, colors, output_file=None):
     """
     Visualize a nonogram solution as an image.
@@ -68,6 +71,9 @@ def visualize_solution(solution, colors, output_file=None):
     # Save or show
     if output_file:
         plt.savefig(output_file, bbox_inches='tight')
-        print(f"Solution visualized and saved to {output_file}")
+        log.info("Solution visualized and saved to %s", output_file)
     else:
         plt.show()
+    
+    # Free the figure, pyplot keeps every open one alive
+    plt.close(fig)
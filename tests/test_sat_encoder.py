@@ -0,0 +1,24 @@
+import random
+import pytest
+from src.generator import random_puzzle
+from src.sat_encoder import ENCODINGS, SATEncoder
+from src.solver import NonogramSolver
+from src.verify import verify_solution
+
+def colored_masks(grid, ncolors):
+    """Sound cell masks that only say which cells are colored, not their color"""
+    any_color = ((1 << (ncolors + 1)) - 1) & ~1
+    return [1 if cell == '-' else any_color for row in grid for cell in row]
+
+@pytest.mark.parametrize('mode', ENCODINGS)
+def test_colored_masks_give_valid_solutions(mode):
+    rng = random.Random(2)
+    for _ in range(20):
+        nonogram, grid = random_puzzle((6, 6), 2, rng=rng)
+        encoder = SATEncoder(nonogram, mode)
+        cnf, layout = encoder.encode(known=colored_masks(grid, 2))
+        solver = NonogramSolver(cnf, layout)
+        model = solver.solve()
+        assert model is not None
+        solution = solver.extract_solution(model, nonogram)
+        assert verify_solution(nonogram, solution)[0], (mode, grid)
@@ -0,0 +1,10 @@
+from src.benchmark import LAZY_MODULES, STARTUP_BUDGET, startup_time
+
+def test_startup_within_budget():
+    seconds, loaded = startup_time()
+    assert loaded == [], f"importing src.main loads {', '.join(loaded)}"
+    assert seconds <= STARTUP_BUDGET, f"importing src.main took {seconds:.4f}s"
+
+def test_lazy_modules_listed():
+    # The heavy imports src.main defers to the code paths using them
+    assert {'pysat.solvers', 'multiprocessing', 'sqlite3', 'matplotlib'} <= set(LAZY_MODULES)